@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Times the start up of the wxt5xx command line, each case runs in a fresh interpreter.
+
+    python benchmarks/cli_startup.py [repeat]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("interpreter", "pass"),
+    ("import wxt5xx.cli", "import wxt5xx.cli"),
+    ("import wxt5xx.message", "import wxt5xx.message"),
+    ("import wxt5xx.comms", "import wxt5xx.comms"),
+    ("parse set_ptu", "from wxt5xx.cli import create_parser; argv = ['set_ptu', '--Ta', '1', 'port']; create_parser(argv).parse_args(argv)"),
+    ("parse convert", "from wxt5xx.cli import create_parser; argv = ['convert', 'in', 'out']; create_parser(argv).parse_args(argv)"),
+]
+
+
+def run(code, repeat):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    durations = []
+    for i in range(repeat):
+        start = time.time()
+        subprocess.check_call([sys.executable, "-c", code], env=env)
+        durations.append(time.time() - start)
+    return durations
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, code in CASES:
+        durations = run(code, repeat)
+        print("%-24s min %.4f s  mean %.4f s" % (name, min(durations), sum(durations) / len(durations)))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,8 @@ setup(name='pyWXT5xx',
       author_email='nigel.blair@gmail.com',
       packages=find_packages(),
       zip_safe=False,
-      install_requires=["pyserial"],
+      install_requires=["pyserial", "futures; python_version < '3'", "selectors34; python_version < '3.4'"],
+      extras_require={"numpy": ["numpy"]},
       entry_points={
             "console_scripts": [
                   "wxt5xx = wxt5xx.cli:main",
@@ -0,0 +1,90 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Shared setup and fixtures of the tests."""
+
+import logging
+
+# cli.configure_logging defines the TRACE level the parsers log at.
+if not hasattr(logging, "TRACE"):
+    logging.TRACE = 5
+    logging.addLevelName(logging.TRACE, "TRACE")
+
+
+def ptu(temperature, unit="C"):
+    """A parsed PTU message with an ambient temperature and humidity."""
+    return [{"Type": "PTU", "Data": {"Temperature": {"Ambient": [temperature, unit]}, "Humidity": ["50.0", "%"]}}]
+
+
+def crc(line):
+    """Appends the CRC of line."""
+    from wxt5xx.message import crc16
+    return line + crc16(line)
+
+
+class ScriptedSerial:
+    """A fake serial port that answers the commands written to it from a script.
+
+    script maps a command name, the command up to its first comma without
+    its CRC such as "0R" or "0R2", to a list of replies, each a list of
+    lines. Every write of the command queues its next reply, commands
+    without a reply left are not answered.
+    """
+
+    def __init__(self, script):
+        self.script = dict((name, list(replies)) for name, replies in script.items())
+        self.written = []
+        self.input = []
+        self.resyncs = 0
+        self.baudrate = 19200
+        self.port = "scripted"
+
+    def write(self, message):
+        from wxt5xx.message import crc16
+        command = message.strip()
+        if len(command) > 3 and crc16(command[:-3]) == command[-3:]:
+            command = command[:-3]
+        name = command.split(",")[0]
+        self.written.append(name)
+        if self.script.get(name):
+            self.input.extend(line + "\r\n" for line in self.script[name].pop(0))
+        return len(message)
+
+    def flush(self):
+        pass
+
+    def readline(self):
+        return self.input.pop(0) if self.input else ""
+
+    def reset_input_buffer(self):
+        self.resyncs += 1
+        self.input = []
+
+    def close(self):
+        pass
+
+
+CONNECTION_INFO = "0XU,M=Q,C=2,B=19200,D=8,P=N,S=1,L=25,N=WXT530,V=3.86"
+
+
+def scripted_device(script, **kwargs):
+    """A WXT5xx at address 0 using the CRC checked ASCII protocol on a ScriptedSerial, Python 2 only."""
+    from wxt5xx.comms import WXT5xx
+    from wxt5xx.message import CommunicationProtocol
+    script = dict(script)
+    script["0xU"] = [[crc(CONNECTION_INFO)], [crc(CONNECTION_INFO)]] + list(script.get("0xU", []))
+    return WXT5xx(ScriptedSerial(script), address=0, protocol=CommunicationProtocol.ASCII_Polled_CRC, **kwargs)
@@ -0,0 +1,119 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+from wxt5xx.aggregate import RainAccumulator, ReorderBuffer, RollingDirection, RollingWindow, StationAggregator
+
+
+def wind(direction, speed, lull=None, gust=None):
+    lull = speed if lull is None else lull
+    gust = speed if gust is None else gust
+    return {"Type": "Wind", "Data": {
+        "Direction": {"Average": ["%s" % direction, "deg"]},
+        "Speed": {"Average": ["%s" % speed, "m/s"], "Limits": [["%s" % lull, "m/s"], ["%s" % gust, "m/s"]]}
+    }}
+
+
+def rain(accumulation, hail=0.0):
+    return {"Type": "Rain", "Data": {
+        "Rain": {"Accumulation": ["%s" % accumulation, "mm"]},
+        "Hail": {"Accumulation": ["%s" % hail, "hits/cm2"]}
+    }}
+
+
+class RollingWindowTest(unittest.TestCase):
+
+    def test_min_max_over_window(self):
+        window = RollingWindow(10)
+        for timestamp, value in [(0, 5.0), (3, 9.0), (6, 1.0), (9, 4.0)]:
+            window.add(timestamp, value)
+        self.assertEqual((window.min(), window.max(), window.count()), (1.0, 9.0, 4))
+        self.assertAlmostEqual(window.mean(), 4.75)
+
+        # The 9.0 and 1.0 expire, the maximum and minimum fall back to the later values.
+        window.add(16, 3.0)
+        self.assertEqual((window.min(), window.max(), window.count()), (3.0, 4.0, 2))
+        window.expire(30)
+        self.assertEqual((window.min(), window.max(), window.mean()), (None, None, None))
+
+
+class RollingDirectionTest(unittest.TestCase):
+
+    def test_mean_wraps_north(self):
+        direction = RollingDirection(60)
+        direction.add(0, 350.0)
+        direction.add(1, 10.0)
+        self.assertAlmostEqual(direction.mean() % 360.0, 0.0, places=6)
+
+    def test_speed_weighted(self):
+        aggregator = StationAggregator(windows=(60,), lateness=0.0)
+        aggregator.add(0, wind(90, 10.0))
+        aggregator.add(1, wind(0, 0.5))
+        aggregator.flush()
+        mean = aggregator.stats()["Wind"][60]["Direction"]["Average"]
+        self.assertLess(abs(mean - 90.0), 5.0)
+
+
+class RainAccumulatorTest(unittest.TestCase):
+
+    def test_counter_reset(self):
+        accumulator = RainAccumulator()
+        for accumulation in [1.0, 1.5, 2.5, 0.5, 1.0]:
+            accumulator.add(0, rain(accumulation))
+        self.assertEqual(accumulator.stats(), {"Rain": 2.5, "Hail": 0.0, "Resets": 1})
+
+    def test_explicit_reset(self):
+        accumulator = RainAccumulator()
+        accumulator.add(0, rain(4.0))
+        accumulator.reset()
+        accumulator.add(1, rain(0.5))
+        self.assertEqual(accumulator.stats()["Rain"], 0.5)
+        self.assertEqual(accumulator.stats()["Resets"], 0)
+
+
+class ReorderBufferTest(unittest.TestCase):
+
+    def test_reorders_within_lateness(self):
+        buffer = ReorderBuffer(lateness=5.0)
+        released = []
+        for timestamp in [10.0, 8.0, 12.0, 16.0]:
+            released.extend(buffer.push(timestamp, timestamp))
+        self.assertEqual([item for timestamp, item in released], [8.0, 10.0])
+        self.assertEqual([item for timestamp, item in buffer.flush()], [12.0, 16.0])
+
+    def test_late_readings_are_dropped(self):
+        buffer = ReorderBuffer(lateness=1.0)
+        buffer.push(10.0, "a")
+        buffer.push(20.0, "b")
+        self.assertEqual(buffer.push(5.0, "late"), [])
+        self.assertEqual(buffer.late, 1)
+        self.assertEqual(buffer.flush(), [(20.0, "b")])
+
+    def test_station_counts_late_readings(self):
+        aggregator = StationAggregator(windows=(60,), lateness=1.0)
+        aggregator.add(10.0, wind(0, 1.0))
+        aggregator.add(20.0, wind(0, 2.0))
+        aggregator.add(5.0, wind(0, 30.0))
+        aggregator.flush()
+        stats = aggregator.stats()
+        self.assertEqual(stats["Late"], 1)
+        self.assertEqual(stats["Wind"][60]["Speed"]["Gust"], 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
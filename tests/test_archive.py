@@ -0,0 +1,99 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers  # noqa: F401, defines logging.TRACE
+from wxt5xx.archive import ArchiveReader, ArchiveWriter, is_archive
+from wxt5xx.records import RecordReader, RecordWriter, convert_capture
+
+
+def lzma_available():
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            return False
+    return True
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "capture.wxa")
+        self.lines = ["%r %sr1,Dm=%03dD,Sm=%.1fM" % (1000.0 + i, "01"[i % 2], i % 360, i % 7) for i in range(1000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, codec="zlib", lines=None):
+        writer = ArchiveWriter(self.path, block_lines=100, codec=codec)
+        for line in self.lines if lines is None else lines:
+            writer.append(line)
+        writer.close()
+        return ArchiveReader(self.path)
+
+    def test_round_trip(self):
+        reader = self.write()
+        self.assertTrue(is_archive(self.path))
+        self.assertEqual(len(reader.entries), 10)
+        self.assertEqual(list(reader.lines()), self.lines)
+
+    @unittest.skipUnless(lzma_available(), "lzma is not available")
+    def test_lzma_round_trip(self):
+        self.assertEqual(list(self.write("lzma").lines()), self.lines)
+
+    def test_untimed_lines(self):
+        reader = self.write(lines=["5.0 0r1,Dm=001D", "0r1,Dm=002D", "", "6.0 0r1,Dm=003D"])
+        self.assertEqual(list(reader.lines()), ["5.0 0r1,Dm=001D", "5.0 0r1,Dm=002D", "6.0 0r1,Dm=003D"])
+
+    def test_query(self):
+        reader = self.write()
+        self.assertEqual(len(reader.blocks(1250.0, 1260.0)), 1)
+        self.assertEqual(len(reader.blocks(addresses=["5"])), 0)
+        expected = [line for line in self.lines if 1250.0 <= float(line.split()[0]) <= 1260.0 and line.split()[1][0] == "1"]
+        self.assertEqual(list(reader.lines(1250.0, 1260.0, ["1"])), expected)
+
+    def test_parallel(self):
+        reader = self.write()
+        self.assertEqual(list(reader.lines(workers=3)), self.lines)
+        self.assertEqual(list(reader.lines(1100.0, 1400.0, ["0"], workers=2)), list(reader.lines(1100.0, 1400.0, ["0"])))
+
+    def test_append_to_existing(self):
+        self.write(lines=self.lines[:500])
+        reader = self.write(lines=self.lines[500:])
+        self.assertEqual(list(reader.lines()), self.lines)
+
+    def test_convert(self):
+        reader = self.write()
+        records = os.path.join(self.directory, "capture.wxr")
+        writer = RecordWriter(records)
+        self.assertEqual(convert_capture(reader.lines(1000.0, 1099.0, ["0"], workers=2), writer, has_crc=False), 0)
+        writer.close()
+        rows = list(RecordReader(records))
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(sorted(row[0] for row in rows), [1000.0 + i for i in range(0, 100, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
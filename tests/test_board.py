@@ -0,0 +1,53 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import unittest
+
+from helpers import ptu
+from wxt5xx.board import ReadingBoard
+
+
+class BoardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.name = "wxt5xx_test_%s" % os.getpid()
+        self.board = ReadingBoard.create(self.name, slots=4)
+
+    def tearDown(self):
+        self.board.close()
+        self.board.unlink()
+
+    def test_mixed_units_are_published_in_si(self):
+        self.board.publish(10.0, "0", ptu("20.0"))
+        self.board.publish(11.0, "1", ptu("68.0", "F"))
+
+        self.assertEqual(self.board.read_units(), {"Ta": "C", "Ua": "%"})
+        self.assertAlmostEqual(self.board.value("0", "Ta"), 20.0, places=4)
+        self.assertAlmostEqual(self.board.value("1", "Ta"), 20.0, places=4)
+        self.assertEqual(self.board.latest("1")["timestamp"], 11.0)
+        self.assertIsNone(self.board.latest("2"))
+
+    def test_unconvertible_unit_change(self):
+        self.board.publish(10.0, "0", ptu("20.0"))
+        self.assertRaises(ValueError, self.board.publish, 11.0, "1", ptu("293.15", "K"))
+        self.assertEqual(self.board.read_units()["Ta"], "C")
+        self.assertIsNone(self.board.latest("1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
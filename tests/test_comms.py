@@ -0,0 +1,103 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import sys
+import time
+import unittest
+
+from helpers import crc, scripted_device
+from wxt5xx.comms import PendingRequest, match_reply
+from wxt5xx.recovery import RecoveryPolicy
+
+# WXT5xx builds its commands from both str and bytes, which only Python 2 allows.
+PYTHON2 = sys.version_info[0] == 2
+
+
+class MatchReplyTest(unittest.TestCase):
+
+    def test_short_lines(self):
+        pending = [PendingRequest("0R1\r\n", False)]
+        for line in ["", "0", "\x00~", "0r1"]:
+            self.assertEqual(match_reply(pending, line, True), (None, None), line)
+        self.assertEqual(match_reply(pending, "", False), (None, None))
+        self.assertEqual(match_reply(pending, "0", False), (None, None))
+
+    def test_match(self):
+        pending = [PendingRequest("0R1\r\n", False), PendingRequest("0R2\r\n", False)]
+        request, prefix = match_reply(pending, "0r2,Ta=20.0C", False)
+        self.assertIs(request, pending[1])
+        self.assertEqual(prefix, "R2")
+        self.assertEqual(match_reply(pending, "1r2,Ta=20.0C", False)[0], None)
+
+
+@unittest.skipUnless(PYTHON2, "WXT5xx requires Python 2")
+class PipelineTest(unittest.TestCase):
+
+    def test_noise_and_bad_replies(self):
+        device = scripted_device({
+            "0R1": [["\x00~", crc("0r1,Dm=100D,Sm=1.0M")]],
+            "0R2": [[crc("0r2,Ta=20.0Q")]],
+            "0R3": [["0r3,Rc=0.0MXXX"]],
+        })
+        start = time.time()
+        wind, ptu, rain = device.pipeline(["0R1\r\n", "0R2\r\n", "0R3\r\n"], timeout=5.0)
+        # The unparseable and the corrupt replies answer their requests, nothing waits for the timeout.
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(wind["Data"]["Speed"]["Average"], ["1.0", "m/s"])
+        self.assertIsNone(ptu)
+        self.assertIsNone(rain)
+
+    def test_timeout(self):
+        device = scripted_device({"0R1": [[crc("0r1,Dm=100D,Sm=1.0M")]]})
+        wind, ptu = device.pipeline(["0R1\r\n", "0R2\r\n"], timeout=0.2)
+        self.assertEqual(wind["Type"], "Wind")
+        self.assertIsNone(ptu)
+
+
+@unittest.skipUnless(PYTHON2, "WXT5xx requires Python 2")
+class RecoveryTest(unittest.TestCase):
+
+    def test_recovers_only_the_lost_message(self):
+        ptu = "0r2,Ta=20.0C,Ua=50.0P,Pa=1000.0H"
+        device = scripted_device({
+            "0R": [[crc("0r1,Dm=100D,Sm=1.0M"), crc(ptu)[:-3] + "XXX", crc("0r3,Rc=0.0M"), crc("0r5,Th=20.0C,Vh=12.0N")]],
+            "0R2": [[crc(ptu)]],
+        }, recovery=RecoveryPolicy(backoff=0))
+        wind, ptu, rain, status = device.get_all_data()
+
+        self.assertEqual(wind["Type"], "Wind")
+        self.assertEqual(ptu["Data"]["Temperature"]["Ambient"], ["20.0", "C"])
+        self.assertEqual(rain["Type"], "Rain")
+        self.assertEqual(status["Type"], "Status")
+        self.assertEqual(device.ser.written[-2:], ["0R", "0R2"])
+        self.assertEqual(device.ser.resyncs, 1)
+        stats = device.recovery.stats()
+        self.assertEqual((stats["Frames"], stats["CRC Errors"], stats["Retries"], stats["Recovered"], stats["Failed"]),
+                         (5, 1, 1, 1, 0))
+
+    def test_gives_up_after_retries(self):
+        device = scripted_device({"0R": [[crc("0r1,Dm=100D,Sm=1.0M")]]}, recovery=RecoveryPolicy(retries=2, backoff=0))
+        wind, ptu, rain, status = device.get_all_data()
+        self.assertEqual(wind["Type"], "Wind")
+        self.assertEqual((ptu, rain, status), (None, None, None))
+        self.assertEqual(device.ser.written.count("0R2"), 2)
+        stats = device.recovery.stats()
+        self.assertEqual((stats["Retries"], stats["Failed"], stats["Recovered"]), (6, 3, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+import helpers  # noqa: F401, defines logging.TRACE
+from wxt5xx.layout import LayoutMessageParser
+from wxt5xx.message import MessageParser
+
+
+FRAMES = [
+    # complete
+    "0r1,Dn=236D,Dm=283D,Dx=031D,Sn=0.0M,Sm=1.0M,Sx=2.2M",
+    "0r2,Ta=23.6C,Tp=26.0C,Ua=14.2P,Pa=1026.6H",
+    "0r3,Rc=0.00M,Rd=0s,Ri=0.0M,Hc=0.0M,Hd=0s,Hi=0.0M,Rp=0.0M,Hp=0.0M",
+    "0r5,Th=25.9C,Vh=12.0N,Vs=15.2V,Vr=3.475V",
+    # trimmed
+    "0r1,Dm=283D,Sm=1.0M",
+    "0r1,Dn=236D,Sx=2.2M",
+    "0r2,Ta=23.6C,Pa=1026.6H",
+    "0r5,Vh=0.0#,Vs=15.2V",
+    # invalid
+    "0r1,Dn=000#,Dm=000#,Dx=000#,Sn=0.0#,Sm=0.0#,Sx=0.0#",
+    "0r2,Ta=23.6C,Tp=#,Ua=14.2P,Pa=1026.6H",
+    # with Id
+    "0r5,Th=25.9C,Vh=12.0N,Vs=15.2V,Vr=3.475V,Id=HEL___",
+    # other stations and units
+    "1r1,Dm=283D,Sm=2.0K",
+    "1r2,Ta=74.5F,Ua=14.2P,Pa=30.3I",
+]
+
+
+class LayoutParityTest(unittest.TestCase):
+
+    def test_matches_generic_parser(self):
+        generic = MessageParser(False)
+        layouts = LayoutMessageParser()
+        parser = MessageParser(False, layouts)
+        for frame in FRAMES:
+            expected = generic.parse_message(frame)
+            # The first parse learns the layout, the second takes the fast path.
+            self.assertEqual(parser.parse_message(frame), expected, frame)
+            self.assertEqual(parser.parse_message(frame), expected, frame)
+        self.assertEqual(layouts.hits, len(FRAMES))
+
+    def test_layout_from_settings(self):
+        layouts = LayoutMessageParser(learn=False)
+        requested = dict((label, label in ("Dm", "Sm")) for label in ("Dn", "Dm", "Dx", "Sn", "Sm", "Sx"))
+        layouts.add_settings("0", "r1", {"R": {"Requested": requested}})
+        parser = MessageParser(False, layouts)
+        frame = "0r1,Dm=283D,Sm=1.0M"
+        self.assertEqual(parser.parse_message(frame), MessageParser(False).parse_message(frame))
+        self.assertEqual(layouts.hits, 1)
+
+    def test_mismatch_falls_back(self):
+        layouts = LayoutMessageParser(learn=False)
+        layouts.add_layout("0", "r2", ["Ta", "Ua"])
+        parser = MessageParser(False, layouts)
+        frame = "0r2,Ta=23.6C,Pa=1026.6H"
+        self.assertEqual(parser.parse_message(frame), MessageParser(False).parse_message(frame))
+        self.assertEqual(layouts.misses, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
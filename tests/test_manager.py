@@ -0,0 +1,91 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import sys
+import threading
+import time
+import unittest
+
+from helpers import CONNECTION_INFO, ScriptedSerial, crc
+from wxt5xx.client import port_lock
+from wxt5xx.manager import StationManager
+
+
+class SlowSerial(ScriptedSerial):
+    """A ScriptedSerial that answers slowly and records when it was closed."""
+
+    def __init__(self, script):
+        ScriptedSerial.__init__(self, script)
+        self.closed = None
+
+    def write(self, message):
+        time.sleep(0.05)
+        return ScriptedSerial.write(self, message)
+
+    def close(self):
+        self.closed = time.time()
+
+
+class ScriptedManager(StationManager):
+
+    def __init__(self):
+        StationManager.__init__(self, health_interval=0)
+        self.transports = []
+
+    def open_transport(self, station):
+        ser = SlowSerial({"0xU": [[crc(CONNECTION_INFO)]] * 10})
+        self.transports.append(ser)
+        return ser
+
+
+@unittest.skipUnless(sys.version_info[0] == 2, "WXT5xx requires Python 2")
+class StationManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = ScriptedManager()
+        self.station = self.manager.add_station("north", "scripted", address=0)
+
+    def test_one_handshake_at_a_time(self):
+        thread = threading.Thread(target=self.manager.check_due)
+        thread.start()
+        client = self.manager.get("north")
+        thread.join()
+        self.assertEqual(len(self.manager.transports), 1)
+        self.assertTrue(self.station.connected)
+        self.assertIsNotNone(client.get_connection_info())
+
+    def test_disconnect_waits_for_the_port(self):
+        self.manager.get("north")
+        ser = self.manager.transports[0]
+        released = []
+
+        def hold():
+            with port_lock(ser):
+                time.sleep(0.2)
+                released.append(time.time())
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        time.sleep(0.05)
+        self.manager.disconnect(self.station, Exception("test"))
+        thread.join()
+        self.assertGreaterEqual(ser.closed, released[0])
+        self.assertFalse(self.station.connected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import unittest
+
+import helpers  # noqa: F401, defines logging.TRACE
+from wxt5xx.message import MessageParser
+
+WIND = "0r1,Dm=100D,Sm=1.0M"
+PTU = "0r2,Ta=20.0C,Ua=50.0P"
+RAIN = "0r3,Rc=0.0M"
+
+
+class MessageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = MessageParser(False, cache_size=2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.parser.parse_message(WIND)
+        self.parser.parse_message(PTU)
+        # Using WIND again leaves PTU as the least recently used frame.
+        self.parser.parse_message(WIND + "\r\n")
+        self.parser.parse_message(RAIN)
+        self.assertEqual(list(self.parser.cache.keys()), [WIND, RAIN])
+
+        self.parser.parse_message(PTU)
+        self.assertEqual(self.parser.cache_stats(), {"Hits": 1, "Misses": 4, "Size": 2, "HitRate": 0.2})
+
+    def test_hits_are_copies(self):
+        first = self.parser.parse_message(WIND)
+        first["Data"]["Speed"]["Average"][0] = "99.0"
+        first["Data"]["Direction"].clear()
+
+        second = self.parser.parse_message(WIND)
+        self.assertEqual(second["Data"]["Speed"]["Average"], ["1.0", "m/s"])
+        self.assertEqual(second["Data"]["Direction"]["Average"], ["100", "deg"])
+        self.assertIsNot(second, self.parser.parse_message(WIND))
+        self.assertEqual(self.parser.cache_stats()["Hits"], 2)
+
+    def test_results_match_uncached_parser(self):
+        uncached = MessageParser(False)
+        for frame in [WIND, PTU, WIND, RAIN, PTU]:
+            self.assertEqual(self.parser.parse_message(frame), uncached.parse_message(frame))
+        self.assertEqual(uncached.cache_stats(), {"Hits": 0, "Misses": 0, "Size": 0, "HitRate": None})
+
+    def test_disabled(self):
+        parser = MessageParser(False)
+        parser.parse_message(WIND)
+        parser.parse_message(WIND)
+        self.assertEqual(len(parser.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
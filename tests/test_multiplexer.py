@@ -0,0 +1,103 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import socket
+import sys
+import time
+import unittest
+
+from helpers import crc
+from wxt5xx.multiplexer import Multiplexer
+
+
+class SocketPort:
+    """The pyserial calls the Multiplexer makes, on one end of a socket pair."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.in_waiting = 4096
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self, size):
+        return self.sock.recv(size)
+
+    def write(self, data):
+        return self.sock.send(data)
+
+    def close(self):
+        self.sock.close()
+
+
+@unittest.skipUnless(sys.version_info[0] == 2, "The Multiplexer frames str lines, which requires Python 2")
+class MultiplexerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.multiplexer = Multiplexer()
+        self.devices = {}
+        self.results = {}
+
+    def tearDown(self):
+        self.multiplexer.close()
+        for device in self.devices.values():
+            device.close()
+
+    def add(self, name, replies):
+        host, device = socket.socketpair()
+        device.setblocking(False)
+        self.devices[name] = device
+        self.multiplexer.add_port(name, SocketPort(host), "0", 60.0, self.callback, messages=["0R1\r\n"], timeout=2.0)
+        return replies
+
+    def callback(self, name, results):
+        self.results[name] = results
+
+    def run_until_done(self, replies):
+        deadline = time.time() + 2.0
+        while len(self.results) < len(self.devices) and time.time() < deadline:
+            self.multiplexer.run_once(max_wait=0.05)
+            for name, device in self.devices.items():
+                try:
+                    request = device.recv(4096)
+                except socket.error:
+                    continue
+                if request:
+                    device.send("".join(line + "\r\n" for line in replies[name]))
+
+    def test_noise_does_not_stop_polling(self):
+        replies = {
+            "noisy": self.add("noisy", ["\x00~", "~", crc("0r1,Dm=100D,Sm=1.0M")]),
+            "quiet": self.add("quiet", [crc("0r1,Dm=200D,Sm=2.0M")]),
+        }
+        self.run_until_done(replies)
+        self.assertEqual(self.results["noisy"][0]["Data"]["Direction"]["Average"], ["100", "deg"])
+        self.assertEqual(self.results["quiet"][0]["Data"]["Direction"]["Average"], ["200", "deg"])
+        self.assertEqual(self.multiplexer.stats()["noisy"]["Completed"], 1)
+
+    def test_bad_reply_completes_poll(self):
+        replies = {"bad": self.add("bad", ["0r1,Dm=100DXXX"])}
+        start = time.time()
+        self.run_until_done(replies)
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(self.results["bad"], [None])
+        self.assertEqual(self.multiplexer.stats()["bad"]["Errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
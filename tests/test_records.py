@@ -0,0 +1,109 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import ptu
+from wxt5xx.records import RecordReader, RecordWriter, convert_capture, address_code
+
+
+class RecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "test.wxr")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        reader = RecordReader(self.path)
+        return [reader.as_dict(row) for row in reader]
+
+    def test_round_trip(self):
+        writer = RecordWriter(self.path, batch_size=2)
+        for i in range(5):
+            writer.append(100.0 + i, "0", ptu("%.1f" % (20 + i)))
+        writer.close()
+
+        rows = self.read()
+        self.assertEqual([row["timestamp"] for row in rows], [100.0 + i for i in range(5)])
+        self.assertEqual([row["Ta"] for row in rows], [[20.0 + i, "C"] for i in range(5)])
+        self.assertTrue(all("Tp" not in row for row in rows))
+
+    def test_append_to_existing(self):
+        writer = RecordWriter(self.path)
+        writer.append(1.0, "0", ptu("20.0"))
+        writer.close()
+        writer = RecordWriter(self.path)
+        writer.append(2.0, "0", ptu("21.0"))
+        writer.close()
+        self.assertEqual([row["Ta"][0] for row in self.read()], [20.0, 21.0])
+
+    def test_addresses(self):
+        self.assertEqual(address_code(0), address_code("0"))
+        writer = RecordWriter(self.path)
+        writer.append(1.0, 0, ptu("20.0"))
+        writer.append(2.0, "A", ptu("20.0"))
+        writer.close()
+        self.assertEqual([row["address"] for row in self.read()], ["0", "A"])
+
+    def test_unit_change(self):
+        writer = RecordWriter(self.path)
+        writer.append(1.0, "0", ptu("20.0"))
+        self.assertRaises(ValueError, writer.append, 2.0, "0", ptu("68.0", "F"))
+        writer.close()
+        self.assertEqual(len(self.read()), 1)
+
+    def test_invalid_values(self):
+        writer = RecordWriter(self.path)
+        writer.append(1.0, "0", [{"Type": "PTU", "Data": {"Temperature": {"Ambient": ["", "invalid"]}}}])
+        writer.close()
+        reader = RecordReader(self.path)
+        row = list(reader)[0]
+        self.assertNotIn("Ta", reader.as_dict(row))
+        self.assertTrue(math.isnan(row[3 + 6]))
+
+    def test_convert_capture(self):
+        lines = [
+            "1.0 0r1,Dm=100D,Sm=1.0M",
+            "1.0 0r2,Ta=20.0C,Ua=50.0P",
+            "2.0 0r1,Dm=110D,Sm=2.0M",
+            "2.0 0r2,Ta=68.0F,Ua=50.0P",
+            "3.0 1r2,Ta=21.0C",
+            "not a frame",
+            "4.0 0r1,Dm=120D,Sm=3.0M",
+        ]
+        writer = RecordWriter(self.path)
+        skipped = convert_capture(lines, writer, has_crc=False)
+        writer.close()
+
+        # The reading in F is skipped and counted, along with the line that does not parse.
+        self.assertEqual(skipped, 3)
+        # Readings still pending at the end are written in no particular order.
+        rows = sorted(self.read(), key=lambda row: row["timestamp"])
+        self.assertEqual([(row["timestamp"], row["address"]) for row in rows], [(1.0, "0"), (3.0, "1"), (4.0, "0")])
+        self.assertEqual(rows[0]["Ta"], [20.0, "C"])
+        self.assertEqual(rows[2]["Sm"], [3.0, "m/s"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import ptu
+from wxt5xx.store import INDEX_SIZE, RecordStore, read_index
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = RecordStore(self.root, partition="hour", block_size=4)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.root)
+
+    def assertColumn(self, column, expected):
+        self.assertEqual(len(column), len(expected))
+        for value, wanted in zip(column, expected):
+            self.assertAlmostEqual(float(value), wanted, places=4)
+
+    def test_round_trip(self):
+        for i in range(20):
+            self.store.append(i * 600.0, "0", ptu("%.1f" % i))
+            self.store.append(i * 600.0, 1, ptu("%.1f" % -i))
+
+        result = self.store.query("0", 0, 20 * 600.0, ["Ta", "Ua"])
+        self.assertEqual(result["Units"], {"Ta": "C", "Ua": "%"})
+        self.assertColumn(result["Data"]["timestamp"], [i * 600.0 for i in range(20)])
+        self.assertColumn(result["Data"]["Ta"], [float(i) for i in range(20)])
+
+        result = self.store.query(1, 3000.0, 6000.0, ["Ta"])
+        self.assertColumn(result["Data"]["timestamp"], [3000.0, 3600.0, 4200.0, 4800.0, 5400.0, 6000.0])
+        self.assertColumn(result["Data"]["Ta"], [-5.0, -6.0, -7.0, -8.0, -9.0, -10.0])
+
+    def test_empty_query(self):
+        self.store.append(0.0, "0", ptu("20.0"))
+        self.assertEqual(len(self.store.query("0", 10000.0, 20000.0)["Data"]["timestamp"]), 0)
+        self.assertEqual(len(self.store.query("5", 0.0, 20000.0)["Data"]["Ta"]), 0)
+
+    def test_unit_change_between_partitions(self):
+        self.store.append(0.0, "0", ptu("20.0"))
+        self.store.append(3600.0, "0", ptu("68.0", "F"))
+
+        result = self.store.query("0", 0.0, 3600.0, ["Ta"])
+        self.assertEqual(result["Units"]["Ta"], "C")
+        self.assertColumn(result["Data"]["Ta"], [20.0, 20.0])
+
+        # A single partition keeps its own unit.
+        result = self.store.query("0", 3600.0, 3600.0, ["Ta"])
+        self.assertEqual(result["Units"]["Ta"], "F")
+        self.assertColumn(result["Data"]["Ta"], [68.0])
+
+    def test_old_partitions_are_closed(self):
+        for hour in range(5):
+            self.store.append(hour * 3600.0, "0", ptu("20.0"))
+            self.store.append(hour * 3600.0, "1", ptu("20.0"))
+        self.assertEqual(len(self.store.open), 2)
+
+        # A late reading reopens its partition.
+        self.store.append(60.0, "0", ptu("21.0"))
+        result = self.store.query("0", 0.0, 3599.0, ["Ta"])
+        self.assertColumn(result["Data"]["Ta"], [20.0, 21.0])
+
+    def test_index_flushed_with_records(self):
+        for i in range(4):
+            self.store.append(i * 60.0, "0", ptu("20.0"))
+        partition = list(self.store.open.values())[0]
+        self.assertEqual(partition.writer.rows, [])
+        self.assertEqual(os.path.getsize(partition.index_path), INDEX_SIZE)
+
+    def test_rebuild_index_after_crash(self):
+        for i in range(6):
+            self.store.append(i * 60.0, "0", ptu("%.1f" % i))
+        self.store.flush()
+        # Records written without their index, as when a crash follows a flush of the writer.
+        for i in range(6, 11):
+            self.store.append(i * 60.0, "0", ptu("%.1f" % i))
+        partition = list(self.store.open.values())[0]
+        partition.writer.flush()
+        partition.writer.f.close()
+        self.store.open = {}
+
+        result = RecordStore(self.root, partition="hour", block_size=4).query("0", 0.0, 3599.0, ["Ta"])
+        self.assertColumn(result["Data"]["Ta"], [float(i) for i in range(11)])
+
+        self.store.append(11 * 60.0, "0", ptu("11.0"))
+        self.store.flush()
+        self.assertEqual(read_index(partition.index_path), [[0.0, 180.0], [240.0, 420.0], [480.0, 660.0]])
+        result = self.store.query("0", 500.0, 3599.0, ["Ta"])
+        self.assertColumn(result["Data"]["Ta"], [9.0, 10.0, 11.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,289 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import heapq
+import logging
+import math
+from collections import deque
+
+
+def value_of(field):
+    """Returns the float value of a parsed [value, unit] field, None if it is missing or invalid."""
+    if field is None or field[1] == 'invalid':
+        return None
+    try:
+        return float(field[0])
+    except ValueError:
+        return None
+
+
+class RollingWindow:
+    """Mean, minimum and maximum of a value over a sliding time window.
+
+    Timestamps must be added in order, the minimum and maximum are kept in
+    monotonic deques so every update is amortised O(1).
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.values = deque()
+        self.maxima = deque()
+        self.minima = deque()
+        self.total = 0.0
+
+    def add(self, timestamp, value):
+        self.values.append((timestamp, value))
+        self.total += value
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((timestamp, value))
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((timestamp, value))
+        self.expire(timestamp)
+
+    def expire(self, now):
+        cutoff = now - self.length
+        while self.values and self.values[0][0] <= cutoff:
+            self.total -= self.values.popleft()[1]
+        while self.maxima and self.maxima[0][0] <= cutoff:
+            self.maxima.popleft()
+        while self.minima and self.minima[0][0] <= cutoff:
+            self.minima.popleft()
+        if not self.values:
+            self.total = 0.0
+
+    def count(self):
+        return len(self.values)
+
+    def mean(self):
+        if not self.values:
+            return None
+        return self.total / len(self.values)
+
+    def max(self):
+        return self.maxima[0][1] if self.maxima else None
+
+    def min(self):
+        return self.minima[0][1] if self.minima else None
+
+
+class RollingDirection:
+    """Circular mean of a direction in degrees over a sliding time window.
+
+    Each direction is added as a vector of length weight, so with the wind
+    speed as the weight the mean is the speed weighted vector mean and
+    calm readings hardly move it.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.values = deque()
+        self.sin = 0.0
+        self.cos = 0.0
+
+    def add(self, timestamp, direction, weight=1.0):
+        radians = math.radians(direction)
+        s = weight * math.sin(radians)
+        c = weight * math.cos(radians)
+        self.values.append((timestamp, s, c))
+        self.sin += s
+        self.cos += c
+        self.expire(timestamp)
+
+    def expire(self, now):
+        cutoff = now - self.length
+        while self.values and self.values[0][0] <= cutoff:
+            timestamp, s, c = self.values.popleft()
+            self.sin -= s
+            self.cos -= c
+        if not self.values:
+            self.sin = self.cos = 0.0
+
+    def mean(self):
+        if not self.values or (abs(self.sin) < 1e-9 and abs(self.cos) < 1e-9):
+            return None
+        return (math.degrees(math.atan2(self.sin, self.cos)) + 360.0) % 360.0
+
+
+class WindAggregator:
+    """Rolling wind averages, gusts, lulls and mean direction over several windows.
+
+    windows are the window lengths in seconds, the average speed and
+    direction come from Sm and Dm, the gust from Sx and the lull from Sn.
+    The mean direction is weighted by Sm, directions without a speed have
+    a weight of 1.
+    """
+
+    def __init__(self, windows=(60, 600, 3600)):
+        self.windows = windows
+        self.speed = dict((w, RollingWindow(w)) for w in windows)
+        self.gust = dict((w, RollingWindow(w)) for w in windows)
+        self.lull = dict((w, RollingWindow(w)) for w in windows)
+        self.direction = dict((w, RollingDirection(w)) for w in windows)
+
+    def add(self, timestamp, message):
+        data = message['Data']
+        speed = data['Speed']
+        direction = data['Direction']
+        average = value_of(speed.get('Average'))
+        limits = [value_of(i) for i in speed.get('Limits', [])]
+        heading = value_of(direction.get('Average'))
+
+        for w in self.windows:
+            if average is not None:
+                self.speed[w].add(timestamp, average)
+            if len(limits) == 2:
+                if limits[0] is not None:
+                    self.lull[w].add(timestamp, limits[0])
+                if limits[1] is not None:
+                    self.gust[w].add(timestamp, limits[1])
+            if heading is not None:
+                self.direction[w].add(timestamp, heading, 1.0 if average is None else average)
+
+    def expire(self, now):
+        for w in self.windows:
+            self.speed[w].expire(now)
+            self.gust[w].expire(now)
+            self.lull[w].expire(now)
+            self.direction[w].expire(now)
+
+    def stats(self):
+        return dict((w, {
+            "Speed": {
+                "Average": self.speed[w].mean(),
+                "Gust": self.gust[w].max(),
+                "Lull": self.lull[w].min(),
+                "Count": self.speed[w].count()
+            },
+            "Direction": {
+                "Average": self.direction[w].mean()
+            }
+        }) for w in self.windows)
+
+
+class RainAccumulator:
+    """Running rain and hail totals from the Rc and Hc counters.
+
+    A counter that goes backwards has been reset, by reset_precipitation
+    or by the device's own counter reset, the new value is then counted as
+    accumulated since the reset.
+    """
+
+    def __init__(self):
+        self.last = {}
+        self.totals = {"Rain": 0.0, "Hail": 0.0}
+        self.resets = 0
+
+    def add(self, timestamp, message):
+        data = message['Data']
+        for kind in self.totals:
+            value = value_of(data.get(kind, {}).get('Accumulation'))
+            if value is None:
+                continue
+            last = self.last.get(kind)
+            if last is None:
+                pass
+            elif value < last:
+                self.resets += 1
+                self.totals[kind] += value
+            else:
+                self.totals[kind] += value - last
+            self.last[kind] = value
+
+    def reset(self):
+        """Marks an explicit counter reset, the next reading is counted from zero."""
+        for kind in self.last:
+            self.last[kind] = 0.0
+
+    def stats(self):
+        return {"Rain": self.totals["Rain"], "Hail": self.totals["Hail"], "Resets": self.resets}
+
+
+class ReorderBuffer:
+    """Holds readings for up to lateness seconds so they are released in timestamp order.
+
+    A reading older than the last released one is too late to be placed and
+    is dropped.
+    """
+
+    def __init__(self, lateness=5.0):
+        self.lateness = lateness
+        self.heap = []
+        self.watermark = None
+        self.newest = None
+        self.sequence = 0
+        self.late = 0
+
+    def push(self, timestamp, item):
+        if self.watermark is not None and timestamp < self.watermark:
+            self.late += 1
+            return []
+        heapq.heappush(self.heap, (timestamp, self.sequence, item))
+        self.sequence += 1
+        if self.newest is None or timestamp > self.newest:
+            self.newest = timestamp
+        return self.release(self.newest - self.lateness)
+
+    def release(self, until):
+        released = []
+        while self.heap and self.heap[0][0] <= until:
+            timestamp, sequence, item = heapq.heappop(self.heap)
+            self.watermark = timestamp
+            released.append((timestamp, item))
+        return released
+
+    def flush(self):
+        return self.release(float("inf"))
+
+
+class StationAggregator:
+    """Incrementally aggregates the parsed messages of one station."""
+
+    def __init__(self, windows=(60, 600, 3600), lateness=5.0):
+        self.wind = WindAggregator(windows)
+        self.rain = RainAccumulator()
+        self.reorder = ReorderBuffer(lateness)
+        self.newest = None
+        self.logger = logging.getLogger(str(StationAggregator))
+
+    def add(self, timestamp, message):
+        if message is None:
+            return
+        if self.newest is None or timestamp > self.newest:
+            self.newest = timestamp
+        for ts, item in self.reorder.push(timestamp, message):
+            self.apply(ts, item)
+
+    def apply(self, timestamp, message):
+        if message['Type'] == "Wind":
+            self.wind.add(timestamp, message)
+        elif message['Type'] == "Rain":
+            self.rain.add(timestamp, message)
+
+    def flush(self):
+        for ts, item in self.reorder.flush():
+            self.apply(ts, item)
+
+    def stats(self):
+        if self.newest is not None:
+            self.wind.expire(self.newest)
+        return {
+            "Wind": self.wind.stats(),
+            "Precipitation": self.rain.stats(),
+            "Late": self.reorder.late
+        }
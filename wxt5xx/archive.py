@@ -0,0 +1,209 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import string
+import struct
+import zlib
+from collections import deque
+
+from wxt5xx.records import split_capture_line
+
+# An archive is a pair of files:
+#   <name>.wxa   independently compressed blocks of capture lines, one after the other
+#   <name>.wxi   one entry per block: offset, compressed length, line count, first and last
+#                timestamp, bitmask of the station addresses in the block, codec
+# so a reader only decompresses the blocks whose time range and stations match a query.
+
+INDEX_FORMAT = "<QIIddQB"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+
+ZLIB = 0
+LZMA = 1
+CODECS = {"zlib": ZLIB, "lzma": LZMA}
+
+ADDRESSES = string.digits + string.ascii_uppercase + string.ascii_lowercase
+
+
+def address_mask(addresses):
+    mask = 0
+    for address in addresses:
+        if address in ADDRESSES:
+            mask |= 1 << ADDRESSES.index(address)
+    return mask
+
+
+def lzma_module():
+    try:
+        import lzma
+    except ImportError:
+        from backports import lzma
+    return lzma
+
+
+def compress(codec, data, level):
+    if codec == ZLIB:
+        return zlib.compress(data, level)
+    return lzma_module().compress(data, preset=level)
+
+
+def decompress(codec, data):
+    if codec == ZLIB:
+        return zlib.decompress(data)
+    return lzma_module().decompress(data)
+
+
+class BlockEntry:
+    def __init__(self, offset, length, lines, first, last, addresses, codec):
+        self.offset = offset
+        self.length = length
+        self.lines = lines
+        self.first = first
+        self.last = last
+        self.addresses = addresses
+        self.codec = codec
+
+    def matches(self, start, end, mask):
+        if start is not None and self.last < start:
+            return False
+        if end is not None and self.first > end:
+            return False
+        return mask is None or self.addresses & mask != 0
+
+    def pack(self):
+        return struct.pack(INDEX_FORMAT, self.offset, self.length, self.lines, self.first, self.last, self.addresses, self.codec)
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".wxi"
+
+
+class ArchiveWriter:
+    """Appends capture lines to an archive in independently compressed blocks."""
+
+    def __init__(self, path, block_lines=4096, codec="zlib", level=6):
+        if codec not in CODECS:
+            raise Exception("Invalid codec: %s, expected: %s" % (codec, sorted(CODECS.keys()).__repr__()))
+        self.path = path
+        self.block_lines = block_lines
+        self.codec = CODECS[codec]
+        self.level = level
+        self.data = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        self.lines = []
+        self.addresses = set()
+        self.first = None
+        self.last = None
+        self.timestamp = 0.0
+
+    def append(self, line):
+        """Adds a capture line, a raw frame optionally preceded by a timestamp."""
+        timestamp, frame = split_capture_line(line)
+        if not frame:
+            return
+        if timestamp is not None:
+            self.timestamp = timestamp
+        self.first = self.timestamp if self.first is None else min(self.first, self.timestamp)
+        self.last = self.timestamp if self.last is None else max(self.last, self.timestamp)
+        self.addresses.add(frame[0])
+        self.lines.append("%r %s" % (self.timestamp, frame))
+        if len(self.lines) >= self.block_lines:
+            self.flush()
+
+    def flush(self):
+        if not self.lines:
+            return
+        data = compress(self.codec, ("\n".join(self.lines) + "\n").encode("latin-1"), self.level)
+        self.data.seek(0, os.SEEK_END)
+        entry = BlockEntry(self.data.tell(), len(data), len(self.lines), self.first, self.last,
+                           address_mask(self.addresses), self.codec)
+        self.data.write(data)
+        self.data.flush()
+        self.index.write(entry.pack())
+        self.index.flush()
+        self.lines = []
+        self.addresses = set()
+        self.first = None
+        self.last = None
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+
+def read_block(path, entry):
+    with open(path, "rb") as f:
+        f.seek(entry.offset)
+        return decompress(entry.codec, f.read(entry.length)).decode("latin-1").splitlines()
+
+
+class ArchiveReader:
+    """Reads the blocks of an archive that match a query, in parallel when workers is given."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        with open(index_path(path), "rb") as f:
+            data = f.read()
+        for i in range(0, len(data) - INDEX_SIZE + 1, INDEX_SIZE):
+            self.entries.append(BlockEntry(*struct.unpack_from(INDEX_FORMAT, data, i)))
+
+    def blocks(self, start=None, end=None, addresses=None):
+        mask = None if addresses is None else address_mask(addresses)
+        return [entry for entry in self.entries if entry.matches(start, end, mask)]
+
+    def lines(self, start=None, end=None, addresses=None, workers=None):
+        """Yields the capture lines with start <= timestamp <= end from the given station addresses.
+
+        With workers the matching blocks are decompressed by a thread pool,
+        zlib and lzma release the GIL while they work. At most workers * 2
+        blocks are in flight, so memory stays bounded however many blocks
+        match. Lines are yielded in archive order either way.
+        """
+        entries = self.blocks(start, end, addresses)
+        if workers:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(workers) as executor:
+                pending = deque()
+                for entry in entries:
+                    pending.append(executor.submit(read_block, self.path, entry))
+                    if len(pending) >= workers * 2:
+                        for line in self.__filter(pending.popleft().result(), start, end, addresses):
+                            yield line
+                while pending:
+                    for line in self.__filter(pending.popleft().result(), start, end, addresses):
+                        yield line
+        else:
+            for entry in entries:
+                for line in self.__filter(read_block(self.path, entry), start, end, addresses):
+                    yield line
+
+    def __filter(self, block, start, end, addresses):
+        for line in block:
+            timestamp, frame = split_capture_line(line)
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                continue
+            if addresses is not None and frame[0] not in addresses:
+                continue
+            yield line
+
+
+def is_archive(path):
+    return path.endswith(".wxa") and os.path.exists(index_path(path))
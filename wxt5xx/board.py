@@ -0,0 +1,257 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from wxt5xx.records import address_code, flatten, FIELD_NAMES
+from wxt5xx.units import CONVERSIONS
+
+# The board is a fixed size header followed by one slot per station:
+#   header: magic, version, number of slots, length of the JSON field/unit table, header sequence, the table
+#   slot:   sequence (uint32), address (uint8), 3 pad bytes, timestamp (float64), valid (uint32),
+#           one float32 per field in FIELD_NAMES order
+# all little endian. The address is the ASCII code of the address character, see
+# records.address_code. The sequence is a seqlock, odd while the publisher writes the slot,
+# readers retry until they see the same even sequence before and after copying the slot.
+# The header sequence guards the unit table the same way. A slot whose sequence is 0 is free,
+# slots are taken in order. Values are published in the SI units of wxt5xx.units so every
+# station shares the one unit table.
+
+MAGIC = b'WXTB'
+VERSION = 2
+HEADER_SIZE = 1024
+HEADER_FORMAT = "<4sHHH2xI"
+SEQUENCE_FORMAT = "<I"
+SLOT_FORMAT = "<IB3xdI" + "f" * len(FIELD_NAMES)
+SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+
+class SharedBlock:
+    """A named block of shared memory, multiprocessing.shared_memory when available, else a mapped file.
+
+    Only the creator owns the block. Before Python 3.13 attaching registers
+    the block with the resource tracker, which unlinks it when the attaching
+    process exits, so attached blocks are unregistered again and readers can
+    come and go without destroying the board.
+    """
+
+    def __init__(self, name, size=None):
+        self.name = name
+        if shared_memory is not None:
+            if size is None:
+                try:
+                    self.shm = shared_memory.SharedMemory(name=name, track=False)
+                except TypeError:
+                    from multiprocessing import resource_tracker
+                    self.shm = shared_memory.SharedMemory(name=name)
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+            else:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.buf = self.shm.buf
+            return
+
+        self.shm = None
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.path = os.path.join(directory, name)
+        if size is None:
+            fd = os.open(self.path, os.O_RDWR)
+            size = os.fstat(fd).st_size
+        else:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            os.ftruncate(fd, size)
+        self.buf = mmap.mmap(fd, size)
+        os.close(fd)
+
+    def close(self):
+        if self.shm is not None:
+            self.buf = None
+            self.shm.close()
+        else:
+            self.buf.close()
+
+    def unlink(self):
+        if self.shm is not None:
+            self.shm.unlink()
+        else:
+            os.remove(self.path)
+
+
+class ReadingBoard:
+    """The latest reading of each station in shared memory.
+
+    One publisher writes each parsed reading into its station's slot, any
+    number of local readers attach by name and read the latest values
+    without locks or serialisation. Values are converted to SI units so
+    stations that report in different units can share the board, a field
+    without a conversion must be reported in the same unit by every station.
+    """
+
+    def __init__(self, block, slots):
+        self.block = block
+        self.slots = slots
+        self.units = [None] * len(FIELD_NAMES)
+        self.sequences = {}
+
+    @staticmethod
+    def create(name, slots=16):
+        board = ReadingBoard(SharedBlock(name, HEADER_SIZE + slots * SLOT_SIZE), slots)
+        board.write_header()
+        return board
+
+    @staticmethod
+    def attach(name):
+        block = SharedBlock(name)
+        magic, version, slots, length, sequence = struct.unpack_from(HEADER_FORMAT, block.buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a WXT5xx reading board: %s" % name)
+        if version != VERSION:
+            raise ValueError("Unsupported reading board version: %s" % version)
+        return ReadingBoard(block, slots)
+
+    def write_header(self):
+        table = json.dumps({"Fields": FIELD_NAMES, "Units": self.units}).encode("utf-8")
+        if struct.calcsize(HEADER_FORMAT) + len(table) > HEADER_SIZE:
+            raise ValueError("Reading board header too large")
+        offset = struct.calcsize(HEADER_FORMAT)
+        sequence = struct.unpack_from(HEADER_FORMAT, self.block.buf, 0)[4]
+        struct.pack_into(HEADER_FORMAT, self.block.buf, 0, MAGIC, VERSION, self.slots, 0, sequence + 1)
+        self.block.buf[offset:offset + len(table)] = table
+        struct.pack_into(HEADER_FORMAT, self.block.buf, 0, MAGIC, VERSION, self.slots, len(table), sequence + 2)
+
+    def read_units(self, retries=1000):
+        """The SI unit of each field as {field: unit}."""
+        offset = struct.calcsize(HEADER_FORMAT)
+        for i in range(retries):
+            length, before = struct.unpack_from(HEADER_FORMAT, self.block.buf, 0)[3:]
+            if before & 1:
+                continue
+            data = bytes(self.block.buf[offset:offset + length])
+            if struct.unpack_from(HEADER_FORMAT, self.block.buf, 0)[4] == before:
+                break
+        else:
+            raise Exception("Could not read a consistent unit table")
+        if length == 0:
+            return {}
+        table = json.loads(data.decode("utf-8"))
+        return dict((field, unit) for field, unit in zip(table["Fields"], table["Units"]) if unit is not None)
+
+    def slot_offset(self, slot):
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+    def find_slot(self, address, allocate=False):
+        code = address_code(address)
+        for slot in range(self.slots):
+            sequence, current = struct.unpack_from("<IB", self.block.buf, self.slot_offset(slot))
+            if sequence == 0:
+                if not allocate:
+                    return None
+                return slot
+            if current == code:
+                return slot
+        if allocate:
+            raise Exception("Reading board is full, %s slots" % self.slots)
+        return None
+
+    def publish(self, timestamp, address, messages):
+        """Writes a reading, messages is a list of parsed data messages such as the result of get_all_data.
+
+        Raises a ValueError if a field's unit has no conversion to the SI unit already on the board.
+        """
+        valid, values, units = flatten(messages)
+        for i in range(len(units)):
+            if units[i] in CONVERSIONS:
+                target, scale, offset = CONVERSIONS[units[i]]
+                values[i] = values[i] * scale + offset
+                units[i] = target
+        for i in range(len(units)):
+            if units[i] is not None and self.units[i] is not None and self.units[i] != units[i]:
+                raise ValueError("Unit of %s is %s, the board holds %s" % (FIELD_NAMES[i], units[i], self.units[i]))
+        changed = False
+        for i in range(len(units)):
+            if units[i] is not None and self.units[i] is None:
+                self.units[i] = units[i]
+                changed = True
+        if changed:
+            self.write_header()
+
+        slot = self.find_slot(address, allocate=True)
+        offset = self.slot_offset(slot)
+        sequence = self.sequences.get(slot, struct.unpack_from(SEQUENCE_FORMAT, self.block.buf, offset)[0])
+        code = address_code(address)
+        struct.pack_into(SEQUENCE_FORMAT, self.block.buf, offset, sequence + 1)
+        struct.pack_into(SLOT_FORMAT, self.block.buf, offset, sequence + 1, code, timestamp, valid, *values)
+        struct.pack_into(SEQUENCE_FORMAT, self.block.buf, offset, sequence + 2)
+        self.sequences[slot] = sequence + 2
+
+    def read_slot(self, slot, retries=1000):
+        offset = self.slot_offset(slot)
+        for i in range(retries):
+            before = struct.unpack_from(SEQUENCE_FORMAT, self.block.buf, offset)[0]
+            if before & 1:
+                continue
+            row = struct.unpack_from(SLOT_FORMAT, self.block.buf, offset)
+            if row[0] == before and struct.unpack_from(SEQUENCE_FORMAT, self.block.buf, offset)[0] == before:
+                return row
+        raise Exception("Could not read a consistent reading from slot %s" % slot)
+
+    def latest(self, address):
+        """The latest reading of address as {"timestamp": t, field: value}, None if it has not published."""
+        slot = self.find_slot(address)
+        if slot is None:
+            return None
+        row = self.read_slot(slot)
+        if row[0] == 0 or row[1] != address_code(address):
+            return None
+        result = {"timestamp": row[2]}
+        valid = row[3]
+        for i in range(len(FIELD_NAMES)):
+            if valid & (1 << i):
+                result[FIELD_NAMES[i]] = row[4 + i]
+        return result
+
+    def value(self, address, field):
+        """The latest value of one field, None if it is missing or invalid."""
+        latest = self.latest(address)
+        if latest is None:
+            return None
+        return latest.get(field)
+
+    def view(self):
+        """A zero copy numpy view of all the slots, readers must check the sequence themselves."""
+        dtype = numpy.dtype([("sequence", "<u4"), ("address", "u1"), ("pad", "V3"), ("timestamp", "<f8"), ("valid", "<u4")] +
+                            [(name, "<f4") for name in FIELD_NAMES])
+        return numpy.frombuffer(self.block.buf, dtype=dtype, count=self.slots, offset=HEADER_SIZE)
+
+    def close(self):
+        self.block.close()
+
+    def unlink(self):
+        self.block.unlink()
@@ -43,18 +43,21 @@ def configure_logging(args):
     logging.addLevelName(logging.TRACE, "TRACE")
     args.logger = logging.getLogger("Main")
 
-def add_serial_arguments(argParse):
-    from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
-    import serial
+# The pyserial constants, repeated here so building the parser does not import serial.
+EIGHTBITS = 8
+PARITY_NONE = 'N'
+STOPBITS_ONE = 1
 
-    parity_choices = [serial.PARITY_NONE, serial.PARITY_EVEN, serial.PARITY_ODD, serial.PARITY_MARK, serial.PARITY_SPACE]
-    stop_choices = [serial.STOPBITS_ONE, serial.STOPBITS_ONE_POINT_FIVE, serial.STOPBITS_TWO]
-    byte_choices = [serial.FIVEBITS, serial.SIXBITS, serial.SEVENBITS, serial.EIGHTBITS]
+def add_serial_arguments(argParse):
+    parity_choices = [PARITY_NONE, 'E', 'O', 'M', 'S']
+    stop_choices = [STOPBITS_ONE, 1.5, 2]
+    byte_choices = [5, 6, 7, EIGHTBITS]
 
     argParse.add_argument("--baudrate", metavar="<baudrate>" ,default=19200, type=int, help="The buad rate, default: 19200.")
     argParse.add_argument("--bytesize", default=EIGHTBITS, type=int, choices=byte_choices, help="The byte size, default: %s."%EIGHTBITS)
     argParse.add_argument("--stopbits", default=STOPBITS_ONE, type=float, choices=stop_choices, help="The stop bits, default: %s."%STOPBITS_ONE)
     argParse.add_argument("--parity", default=PARITY_NONE, type=str, choices=parity_choices, help="The stop bits, default: %s."%PARITY_NONE)
+    argParse.add_argument("--record", metavar="<capture>", help="Record the traffic with the device to a capture file.")
     argParse.add_argument("port", metavar="<port>", help="The serial port connected to the Vaisala.")
 
 def get_serial_config(args):
@@ -68,7 +71,12 @@ def create_device(args):
     from serial import Serial
     configure_logging(args)
 
-    device = WXT5xx(Serial(**get_serial_config(args)), service_port=False, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC)
+    ser = Serial(**get_serial_config(args))
+    if args.record is not None:
+        from wxt5xx.replay import RecordingSerial
+        ser = RecordingSerial(ser, args.record)
+
+    device = WXT5xx(ser, service_port=False, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC)
     return device
 
 def read(args):
@@ -94,6 +102,30 @@ def add_ptu_arguments(parser):
     parser.add_argument("--cTp" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Internal Temperature (Used in pressure caculation)")
 
 
+def add_wind_arguments(parser):
+    parser.add_argument("--interval", metavar="<interval>", default=None, type=int, choices=range(1, 3600), help="The update interval from 1 to 3600 seconds.")
+    parser.add_argument("--averaging", metavar="<averaging>", type=int, choices=range(1, 3600), help="The averaging time from 1 to 3600 seconds.")
+    parser.add_argument("--min_max_mode", type=int, choices=[1, 3], help="The Min/Max calculation mode: 1 = minimum/maximum, 3 = gust/lull.")
+    parser.add_argument("--speed_unit", type=str, choices=["M", "K", "S", "N"], help="The Speed Unit: M = m/s, K = km/h, S = mph, N = knots.")
+    parser.add_argument("--direction_offset", metavar="<direction_offset>", type=int, choices=range(-180, 181), help="The direction offset from -180 to 180 degrees.")
+    parser.add_argument("--nmea_formatter", type=str, choices=["T", "W"], help="The NMEA wind formatter: T = XDR, W = MWV.")
+    parser.add_argument("--sampling_rate", type=int, choices=[1, 2, 4], help="The sampling rate in Hz.")
+
+    parser.add_argument("--Dn" ,type=bool, choices=[True, False], help="(En/Dis)able Wind direction minimum")
+    parser.add_argument("--Dm" ,type=bool, choices=[True, False], help="(En/Dis)able Wind direction average")
+    parser.add_argument("--Dx" ,type=bool, choices=[True, False], help="(En/Dis)able Wind direction maximum")
+    parser.add_argument("--Sn" ,type=bool, choices=[True, False], help="(En/Dis)able Wind speed minimum")
+    parser.add_argument("--Sm" ,type=bool, choices=[True, False], help="(En/Dis)able Wind speed average")
+    parser.add_argument("--Sx" ,type=bool, choices=[True, False], help="(En/Dis)able Wind speed maximum")
+
+    parser.add_argument("--cDn" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind direction minimum")
+    parser.add_argument("--cDm" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind direction average")
+    parser.add_argument("--cDx" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind direction maximum")
+    parser.add_argument("--cSn" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind speed minimum")
+    parser.add_argument("--cSm" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind speed average")
+    parser.add_argument("--cSx" ,type=bool, choices=[True, False], help="Composite Message (En/Dis)able Wind speed maximum")
+
+
 def add_precip_arguments(parser):
     parser.add_argument("--interval", metavar="<interval>", default=60, type=int, choices=range(1, 3600), help="The update interval (for automatic mode) from 1 to 3600 seconds.")
     parser.add_argument("--precip_unit", type=str, choices=["M", "I"], help="The Precipitation Units: M = Metric, I = Imperial.")
@@ -169,6 +201,45 @@ def set_ptu(args):
     device.close()
 
 
+def get_wind(args):
+    device = create_device(args)
+    pprint(device.get_wind_settings())
+    device.close()
+
+def set_wind(args):
+    device = create_device(args)
+    settings = device.get_wind_settings()
+
+    args.logger.info("Original: %s"%settings)
+
+    if args.interval is not None:
+        settings['I'] = str(args.interval)
+    if args.averaging is not None:
+        settings['A'] = str(args.averaging)
+    if args.min_max_mode is not None:
+        settings['G'] = str(args.min_max_mode)
+    if args.speed_unit is not None:
+        settings['U'] = str(args.speed_unit)
+    if args.direction_offset is not None:
+        settings['D'] = str(args.direction_offset)
+    if args.nmea_formatter is not None:
+        settings['N'] = str(args.nmea_formatter)
+    if args.sampling_rate is not None:
+        settings['F'] = str(args.sampling_rate)
+
+    for field in ["Dn", "Dm", "Dx", "Sn", "Sm", "Sx"]:
+        if getattr(args, field) is not None:
+            settings['R']['Requested'][field] = getattr(args, field)
+        if getattr(args, "c" + field) is not None:
+            settings['R']['Composite'][field] = getattr(args, "c" + field)
+
+    args.logger.info("Updated : %s"%settings)
+
+    device.set_wind_settings(settings)
+
+    device.close()
+
+
 def get_precip(args):
     device = create_device(args)
     pprint(device.get_precipitation_settings())
@@ -302,50 +373,124 @@ def set_sup(args):
 
     device.close()
 
+def convert(args):
+    from wxt5xx.records import RecordWriter, convert_capture
+    from wxt5xx.archive import ArchiveReader, is_archive
+    configure_logging(args)
 
-def main():
+    writer = RecordWriter(args.output)
+    if is_archive(args.capture):
+        lines = ArchiveReader(args.capture).lines(args.start, args.end, args.station, workers=args.workers)
+        skipped = convert_capture(lines, writer, has_crc=not args.no_crc, cache_size=args.parse_cache)
+    else:
+        with open(args.capture) as capture:
+            skipped = convert_capture(capture, writer, has_crc=not args.no_crc, cache_size=args.parse_cache)
+    writer.close()
+    args.logger.info("Skipped %s frames" % skipped)
+
+def archive(args):
+    from wxt5xx.archive import ArchiveWriter
+    configure_logging(args)
 
-    parser = ArgumentParser(description="Manage a Vaisala device.")
+    writer = ArchiveWriter(args.output, block_lines=args.block_lines, codec=args.codec, level=args.level)
+    with open(args.capture) as capture:
+        for line in capture:
+            writer.append(line)
+    writer.close()
 
-    subparsers = parser.add_subparsers(title='Commands',
-                           dest="command")
+def replay(args):
+    from wxt5xx.replay import benchmark
+    configure_logging(args)
 
-    read_parser = subparsers.add_parser("read", help="Make a reading from the device.")
-    add_arguments(read_parser)
-    add_serial_arguments(read_parser)
+    durations = benchmark(args.capture, operation=args.operation, repeat=args.repeat, realtime=args.realtime)
+    for duration in durations:
+        print("%s: %.6f s" % (args.operation, duration))
+    print("Total: %.6f s, Mean: %.6f s" % (sum(durations), sum(durations) / len(durations)))
 
-    ptu_parser = subparsers.add_parser("get_ptu", help="Retrieve the PTU settings.")
-    add_arguments(ptu_parser)
-    add_serial_arguments(ptu_parser)
 
-    ptu_parser = subparsers.add_parser("set_ptu", help="Set the PTU settings.")
-    add_arguments(ptu_parser)
-    add_serial_arguments(ptu_parser)
-    add_ptu_arguments(ptu_parser)
+def serve(args):
+    from wxt5xx.server import CachedDevice, create_server
 
-    precip_parser = subparsers.add_parser("get_precip", help="Set the Precipitation settings.")
-    add_arguments(precip_parser)
-    add_serial_arguments(precip_parser)
+    device = create_device(args)
+    server = create_server(CachedDevice(device, ttl=args.ttl), socket_path=args.socket, host=args.host, port=args.http_port)
+    args.logger.info("Serving on %s" % (args.socket or "%s:%s" % (args.host, args.http_port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        device.close()
+
+def add_serve_arguments(parser):
+    parser.add_argument("--ttl", default=5.0, type=float, help="How long a cached reading or setting is served before the device is polled again, default: 5 seconds.")
+    parser.add_argument("--socket", metavar="<socket>", help="Serve on this Unix domain socket instead of TCP.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to serve HTTP on, default: 127.0.0.1.")
+    parser.add_argument("--http_port", default=8080, type=int, help="The port to serve HTTP on, default: 8080.")
+
+def add_convert_arguments(parser):
+    parser.add_argument("--no_crc", action="store_true", help="The captured frames do not have a CRC.")
+    parser.add_argument("--start", type=float, help="Only convert frames from this unix time onwards, archives only.")
+    parser.add_argument("--end", type=float, help="Only convert frames up to this unix time, archives only.")
+    parser.add_argument("--station", action="append", help="Only convert frames from this address, may be repeated, archives only.")
+    parser.add_argument("--parse_cache", default=1024, type=int, help="The number of distinct frames whose parsed results are cached, 0 disables the cache, default: 1024.")
+    parser.add_argument("--workers", type=int, help="Decompress archive blocks on this many threads.")
+    parser.add_argument("capture", metavar="<capture>", help="The capture log, one frame per line optionally preceded by a timestamp, or a .wxa archive.")
+    parser.add_argument("output", metavar="<output>", help="The record file to append to.")
+
+def add_archive_arguments(parser):
+    parser.add_argument("--codec", default="zlib", choices=["zlib", "lzma"], help="The block compression, lzma needs Python 3 or backports.lzma, default: zlib.")
+    parser.add_argument("--level", default=6, type=int, help="The compression level, default: 6.")
+    parser.add_argument("--block_lines", default=4096, type=int, help="The number of capture lines per block, default: 4096.")
+    parser.add_argument("capture", metavar="<capture>", help="The capture log, one frame per line optionally preceded by a timestamp.")
+    parser.add_argument("output", metavar="<output>", help="The .wxa archive to append to, its index is written next to it.")
+
+def add_replay_arguments(parser):
+    parser.add_argument("--operation", default="get_all_data", help="The WXT5xx method that was recorded, default: get_all_data.")
+    parser.add_argument("--repeat", default=1, type=int, help="The number of times the operation was recorded, default: 1.")
+    parser.add_argument("--realtime", action="store_true", help="Replay at the recorded speed instead of as fast as possible.")
+    parser.add_argument("capture", metavar="<capture>", help="The capture file.")
+
+
+# (command, help, argument builders), only the builders of the command being run are called.
+COMMANDS = [
+    ("read", "Make a reading from the device.", [add_arguments, add_serial_arguments]),
+    ("get_ptu", "Retrieve the PTU settings.", [add_arguments, add_serial_arguments]),
+    ("set_ptu", "Set the PTU settings.", [add_arguments, add_serial_arguments, add_ptu_arguments]),
+    ("get_wind", "Retrieve the Wind settings.", [add_arguments, add_serial_arguments]),
+    ("set_wind", "Set the Wind settings, trim the Requested fields to shrink every wind message.", [add_arguments, add_serial_arguments, add_wind_arguments]),
+    ("get_precip", "Set the Precipitation settings.", [add_arguments, add_serial_arguments]),
+    ("set_precip", "Get the Precipitation settings, for more detail see Page 138-143 of the Manual for more details.", [add_arguments, add_serial_arguments, add_precip_arguments]),
+    ("get_sup", "Set the Supervisor settings.", [add_arguments, add_serial_arguments]),
+    ("set_sup", "Get the Supervisor settings, for more detail see Page 144-147 of the Manual for more details.", [add_arguments, add_serial_arguments, add_supervisor_arguments]),
+    ("serve", "Own the device and serve cached readings and settings over HTTP.", [add_arguments, add_serial_arguments, add_serve_arguments]),
+    ("convert", "Convert a raw capture log into a binary record file.", [add_arguments, add_convert_arguments]),
+    ("archive", "Compress a raw capture log into a block indexed archive.", [add_arguments, add_archive_arguments]),
+    ("replay", "Replay a capture recorded with --record and time the calls.", [add_arguments, add_replay_arguments]),
+]
+
+
+def create_parser(argv):
+    parser = ArgumentParser(description="Manage a Vaisala device.")
 
-    precip_parser = subparsers.add_parser("set_precip", help="Get the Precipitation settings, for more detail see Page 138-143 of the Manual for more details.")
-    add_arguments(precip_parser)
-    add_serial_arguments(precip_parser)
-    add_precip_arguments(precip_parser)
+    subparsers = parser.add_subparsers(title='Commands',
+                           dest="command")
 
+    command = argv[0] if argv else None
+    for name, description, builders in COMMANDS:
+        command_parser = subparsers.add_parser(name, help=description)
+        if name == command:
+            for builder in builders:
+                builder(command_parser)
 
-    sup_parser = subparsers.add_parser("get_sup", help="Set the Supervisor settings.")
-    add_arguments(sup_parser)
-    add_serial_arguments(sup_parser)
+    return parser
 
-    sup_parser = subparsers.add_parser("set_sup", help="Get the Supervisor settings, for more detail see Page 144-147 of the Manual for more details.")
-    add_arguments(sup_parser)
-    add_serial_arguments(sup_parser)
-    add_supervisor_arguments(sup_parser)
 
-    args = parser.parse_args()
+def main():
+
+    argv = sys.argv[1:]
+    args = create_parser(argv).parse_args(argv)
 
-    # func_name = sys.argv[1]
-    # sys.argv = sys.argv[1:]
     globals()[args.command](args)
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+import threading
+
+from concurrent.futures import Future
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+__port_locks__ = {}
+__port_locks_lock__ = threading.Lock()
+
+
+def port_lock(ser):
+    """Returns the lock shared by every client of the serial port."""
+    key = getattr(ser, "port", None) or id(ser)
+    with __port_locks_lock__:
+        if key not in __port_locks__:
+            __port_locks__[key] = threading.RLock()
+        return __port_locks__[key]
+
+
+class LockedWXT5xx:
+    """Calls the methods of a WXT5xx from the calling thread while holding its port lock."""
+
+    def __init__(self, device):
+        self.device = device
+
+    def __getattr__(self, name):
+        attribute = getattr(self.device, name)
+        if not callable(attribute):
+            return attribute
+
+        def locked(*args, **kwargs):
+            with port_lock(self.device.ser):
+                return attribute(*args, **kwargs)
+        return locked
+
+
+class ThreadedWXT5xx:
+    """Shares one WXT5xx between many threads.
+
+    Every request is put on a queue and performed by a single I/O worker
+    that owns the port, the caller gets a Future for the result. The worker
+    holds the per port lock for the duration of a request, so other clients
+    of the same port are kept out of its write/read cycles.
+    """
+
+    __stop__ = object()
+
+    def __init__(self, device):
+        self.device = device
+        self.lock = port_lock(device.ser)
+        self.requests = Queue()
+        self.closed = False
+        self.closed_lock = threading.Lock()
+        self.logger = logging.getLogger(str(ThreadedWXT5xx))
+        self.worker = threading.Thread(target=self.run, name="WXT5xx-%s" % self.device.address)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is ThreadedWXT5xx.__stop__:
+                break
+            future, method, args = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self.lock:
+                    result = getattr(self.device, method)(*args)
+            except Exception as e:
+                self.logger.debug("Request %s failed: %s" % (method, e))
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def submit(self, method, *args):
+        """Queues a call of a WXT5xx method, raises a RuntimeError once the client is closed."""
+        future = Future()
+        with self.closed_lock:
+            if self.closed:
+                raise RuntimeError("Cannot submit %s, the client is closed" % method)
+            self.requests.put((future, method, args))
+        return future
+
+    def get_connection_info(self):
+        return self.submit("get_connection_info")
+
+    def get_all_data(self):
+        return self.submit("get_all_data")
+
+    def get_data(self, results):
+        return self.submit("get_data", results)
+
+    def get_wind_data(self):
+        return self.submit("get_wind_data")
+
+    def get_ptu_data(self):
+        return self.submit("get_ptu_data")
+
+    def get_rain_data(self):
+        return self.submit("get_rain_data")
+
+    def get_status_data(self):
+        return self.submit("get_status_data")
+
+    def get_all_settings(self):
+        return self.submit("get_all_settings")
+
+    def pipeline(self, messages, timeout=2.0):
+        return self.submit("pipeline", messages, timeout)
+
+    def get_ptu_settings(self):
+        return self.submit("get_ptu_settings")
+
+    def set_ptu_settings(self, settings):
+        return self.submit("set_ptu_settings", settings)
+
+    def get_wind_settings(self):
+        return self.submit("get_wind_settings")
+
+    def set_wind_settings(self, settings):
+        return self.submit("set_wind_settings", settings)
+
+    def get_precipitation_settings(self):
+        return self.submit("get_precipitation_settings")
+
+    def set_precipitation_settings(self, settings):
+        return self.submit("set_precipitation_settings", settings)
+
+    def reset_precipitation(self):
+        return self.submit("reset_precipitation")
+
+    def get_supervisor_settings(self):
+        return self.submit("get_supervisor_settings")
+
+    def set_supervisor_settings(self, settings):
+        return self.submit("set_supervisor_settings", settings)
+
+    def close(self):
+        """Finishes the queued requests then closes the device."""
+        with self.closed_lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.requests.put(ThreadedWXT5xx.__stop__)
+        self.worker.join()
+        self.device.close()
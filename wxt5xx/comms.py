@@ -18,13 +18,73 @@
 import logging
 import time
 
-from wxt5xx.message import MessageParser, Message, ASCIIMessage, CommunicationProtocol
+from wxt5xx.message import MessageParser, Message, ASCIIMessage, CommunicationProtocol, crc16, InvalidCRC, DATA_RESULTS, \
+    WIND_RESULT, PTU_RESULT, RAIN_RESULT, STATUS_RESULT, valid_baud_rates
+from wxt5xx.recovery import RecoveryPolicy
+
+
+class PendingRequest:
+    """A request that has been written to the port but not yet fully answered.
+
+    Replies are matched on the address of the device and the command prefix
+    of the reply, a poll of all data (R) is answered by four lines (r1, r2,
+    r3, r5), command responses such as a precipitation reset are answered
+    by a tX line and every other command echoes its own prefix.
+    """
+
+    def __init__(self, message, has_checksum):
+        body = message.strip()
+        if has_checksum and len(body) > 4 and crc16(body[:-3]) == body[-3:]:
+            body = body[:-3]
+        self.message = message
+        self.address = body[0]
+        self.command = body[1:].split(",")[0]
+        self.expected = PendingRequest.expected_replies(self.command)
+        self.replies = {}
+
+    @staticmethod
+    def expected_replies(command):
+        command = command.upper()
+        if command == "R":
+            return ["R1", "R2", "R3", "R5"]
+        if command.startswith("XZ"):
+            return ["TX"]
+        return [command]
+
+    def accepts(self, address, prefix):
+        return address == self.address and prefix in self.expected and prefix not in self.replies
+
+    def is_complete(self):
+        return len(self.replies) == len(self.expected)
+
+    def result(self):
+        results = [self.replies.get(prefix) for prefix in self.expected]
+        if len(results) == 1:
+            return results[0]
+        return results
+
+
+def match_reply(pending, line, has_crc):
+    """Returns the pending request a reply line answers and the prefix of the reply, the request is None if no request expects it.
+
+    A line too short to hold an address and a prefix, such as line noise, returns (None, None).
+    """
+    body = line[:-3] if has_crc else line
+    if len(body) < 2:
+        return None, None
+    address = body[0]
+    prefix = body[1:].split(",")[0].upper()
+    for request in pending:
+        if request.accepts(address, prefix):
+            return request, prefix
+    return None, prefix
 
 
 class WXT5xx:
-    def __init__(self, ser, service_port=False, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC):
+    def __init__(self, ser, service_port=False, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC, recovery=None, cache_size=0):
         self.ser = ser
-        self.parser = MessageParser(CommunicationProtocol.has_crc(protocol))
+        self.recovery = RecoveryPolicy() if recovery is None else recovery
+        self.parser = MessageParser(CommunicationProtocol.has_crc(protocol), cache_size=cache_size)
         self.logger = logging.getLogger(str(WXT5xx))
 
         if service_port:
@@ -49,6 +109,14 @@ class WXT5xx:
         self.__write(self.protocol.set_communication_settings())
         self.coms_settings = self.read_message()
 
+    def reconnect(self, ser):
+        """Replaces the transport, keeping the address and protocol found during the handshake."""
+        try:
+            self.ser.close()
+        except Exception as e:
+            self.logger.debug("Error closing transport: %s" % e)
+        self.ser = ser
+
     def __write(self, message):
         self.logger.debug("Sending Message: "+message.strip())
         self.ser.write(message)
@@ -62,15 +130,129 @@ class WXT5xx:
         self.logger.debug("Parsed Message: %s"%parsed)
         return parsed
 
+    def pipeline(self, messages, timeout=2.0):
+        """Write several requests to the port before collecting any of the replies.
+
+        Each reply is matched to its request by address and command prefix, a
+        request that is not answered before the timeout expires has None in
+        its slot, as does one whose reply could not be parsed. The results are
+        returned in the order of the requests.
+        """
+        pending = [PendingRequest(message, self.protocol.has_checksum) for message in messages]
+        for request in pending:
+            self.__write(request.message)
+
+        deadline = time.time() + timeout
+        while not all(request.is_complete() for request in pending) and time.time() < deadline:
+            line = self.ser.readline().strip()
+            if not line:
+                continue
+            self.logger.debug("Received message: " + line)
+
+            request, prefix = match_reply(pending, line, self.parser.has_crc)
+            if request is None:
+                self.logger.warning("Unexpected message: %s" % line)
+                continue
+
+            # A reply that fails to parse still answers its request, with None.
+            try:
+                request.replies[prefix] = self.parser.parse_message(line)
+            except InvalidCRC:
+                self.logger.warning("Invalid CRC in reply to %s: %s" % (request.command, line))
+                request.replies[prefix] = None
+            except Exception as e:
+                self.logger.warning("Could not parse reply to %s: %s: %s" % (request.command, line, e))
+                request.replies[prefix] = None
+
+        for request in pending:
+            if not request.is_complete():
+                self.logger.warning("Timed out waiting for reply to: %s" % request.message.strip())
+
+        return [request.result() for request in pending]
+
+    def get_connection_info(self):
+        self.__write(self.protocol.get_connection_info())
+        return self.read_message()
+
+    def __read_data(self, count):
+        """Reads up to count data messages keyed by result type, bad frames are counted and skipped."""
+        results = {}
+        for i in range(count):
+            line = self.ser.readline().strip()
+            if not line:
+                self.recovery.count("Timeouts")
+                break
+            self.logger.debug("Received message: " + line)
+            try:
+                parsed = self.parser.parse_message(line)
+            except InvalidCRC:
+                self.recovery.frame(False)
+                self.recovery.count("CRC Errors")
+                self.logger.warning("Invalid CRC: %s" % line)
+                continue
+            except Exception as e:
+                self.recovery.frame(False)
+                self.recovery.count("Parse Errors")
+                self.logger.warning("Could not parse %s: %s" % (line, e))
+                continue
+            self.recovery.frame(True)
+            body = line[:-3] if self.parser.has_crc else line
+            results[body[1:].split(",")[0].lower()] = parsed
+        return results
+
     def get_all_data(self):
+        """Polls all of the data messages.
+
+        Bad frames do not discard the rest of the batch, the input is
+        resynchronised and only the lost message types are requested again
+        according to the recovery policy. A message type that could not be
+        recovered is returned as None.
+        """
         self.__write(self.protocol.read_all_data())
         time.sleep(0.1)
-        results = []
-        results.append(self.read_message())
-        results.append(self.read_message())
-        results.append(self.read_message())
-        results.append(self.read_message())
-        return results
+        results = self.__read_data(len(DATA_RESULTS))
+
+        for result in DATA_RESULTS:
+            attempt = 0
+            while result not in results and attempt < self.recovery.retries:
+                self.recovery.count("Retries")
+                time.sleep(self.recovery.delay(attempt))
+                self.recovery.resync(self.ser)
+                self.__write(self.protocol.read_data(result))
+                results.update(self.__read_data(1))
+                attempt += 1
+
+            if result not in results:
+                self.recovery.count("Failed")
+                self.logger.warning("Could not recover message: %s" % result)
+            elif attempt > 0:
+                self.recovery.count("Recovered")
+
+        return [results.get(result) for result in DATA_RESULTS]
+
+    def get_data(self, results):
+        """Polls a subset of the data messages, returns a dict keyed by result type.
+
+        The requests are pipelined so the subset costs one bus transaction,
+        asking for every message type falls back to get_all_data.
+        """
+        results = [result for result in DATA_RESULTS if result in results]
+        if len(results) == len(DATA_RESULTS):
+            return dict(zip(DATA_RESULTS, self.get_all_data()))
+        replies = self.pipeline([self.protocol.read_data(result) for result in results])
+        return dict(zip(results, replies))
+
+    def get_wind_data(self):
+        return self.get_data([WIND_RESULT])[WIND_RESULT]
+
+    def get_ptu_data(self):
+        return self.get_data([PTU_RESULT])[PTU_RESULT]
+
+    def get_rain_data(self):
+        return self.get_data([RAIN_RESULT])[RAIN_RESULT]
+
+    def get_status_data(self):
+        return self.get_data([STATUS_RESULT])[STATUS_RESULT]
 
     def get_ptu_settings(self):
         self.__write(self.protocol.get_ptu_settings())
@@ -82,6 +264,16 @@ class WXT5xx:
         time.sleep(0.1)
         return self.read_message()
 
+    def get_wind_settings(self):
+        self.__write(self.protocol.get_wind_settings())
+        time.sleep(0.1)
+        return self.read_message()
+
+    def set_wind_settings(self, settings):
+        self.__write(self.protocol.set_wind_settings(settings))
+        time.sleep(0.1)
+        return self.read_message()
+
     def get_precipitation_settings(self):
         self.__write(self.protocol.get_precipitation_settings())
         time.sleep(0.1)
@@ -95,12 +287,10 @@ class WXT5xx:
 
 
     def reset_precipitation(self):
-        results = []
-        self.__write(self.protocol.reset_precipation_intensity())
-        results.append(self.read_message())
-        self.__write(self.protocol.reset_precipation_counter())
-        results.append(self.read_message())
-        return results
+        return self.pipeline([
+            self.protocol.reset_precipation_intensity(),
+            self.protocol.reset_precipation_counter()
+        ])
 
     def get_supervisor_settings(self):
         self.__write(self.protocol.get_supervisor_settings())
@@ -112,5 +302,99 @@ class WXT5xx:
         time.sleep(0.1)
         return self.read_message()
 
+    def get_all_settings(self):
+        wind, ptu, precipitation, supervisor = self.pipeline([
+            self.protocol.get_wind_settings(),
+            self.protocol.get_ptu_settings(),
+            self.protocol.get_precipitation_settings(),
+            self.protocol.get_supervisor_settings()
+        ])
+        return {"Wind": wind, "PTU": ptu, "Precipitation": precipitation, "Supervisor": supervisor}
+
+    def __switch_baud_rate(self, rate, settle):
+        """Asks the device to change to rate, resets it and follows it with the port.
+
+        Communication settings take effect after a reset, a device that
+        applies them at once ignores the reset sent at the old rate.
+        """
+        self.__write(self.protocol.set_communication_settings(baud_rate=rate))
+        try:
+            self.logger.info("Set baud rate response: %s" % self.read_message())
+        except Exception as e:
+            self.logger.debug("No response to baud rate change: %s" % e)
+        self.__write(self.protocol.reset())
+        self.ser.baudrate = rate
+        time.sleep(settle)
+        self.recovery.resync(self.ser)
+
+    def __confirm_link(self, soak):
+        """Makes CRC checked round trips for soak seconds, returns False at the first failure."""
+        end = time.time() + soak
+        while True:
+            try:
+                if not self.get_connection_info():
+                    return False
+            except Exception as e:
+                self.logger.debug("Round trip failed: %s" % e)
+                return False
+            if time.time() >= end:
+                return True
+
+    def negotiate_baud_rate(self, max_rate=None, soak=5.0, settle=2.0, attempts=3):
+        """Steps the device and port up to the fastest baud rate that stays error free.
+
+        Each valid baud rate above the current one is confirmed with CRC
+        checked round trips for soak seconds, the first rate that fails
+        ends the negotiation and the link falls back to the last good rate.
+        The fallback command is sent at the failed rate, it is sent again up
+        to attempts times as the unreliable link may lose it. settle must
+        cover the restart after each reset. Returns the baud rate in use.
+        """
+        good = self.ser.baudrate
+        for rate in valid_baud_rates:
+            if rate <= good or (max_rate is not None and rate > max_rate):
+                continue
+            self.logger.info("Trying baud rate: %s" % rate)
+            self.__switch_baud_rate(rate, settle)
+            if self.__confirm_link(soak):
+                good = rate
+                continue
+
+            self.logger.warning("Baud rate %s is unreliable, falling back to %s" % (rate, good))
+            for attempt in range(attempts):
+                # Until the fallback is confirmed the device may still be at the failed rate.
+                self.ser.baudrate = rate
+                self.__switch_baud_rate(good, settle)
+                if self.__confirm_link(0):
+                    break
+                self.logger.debug("Fallback to baud rate %s not confirmed, attempt %s" % (good, attempt + 1))
+            else:
+                raise Exception("Lost the link while falling back to baud rate %s" % good)
+            break
+
+        self.coms_settings = self.get_connection_info()
+        return good
+
+    def specialise_parser(self):
+        """Switches to a parser specialised to the field layout configured on the device.
+
+        The layouts are compiled from the device settings, a layout whose
+        settings could not be read is learned from the first message.
+        """
+        from wxt5xx.layout import LayoutMessageParser
+        layouts = LayoutMessageParser()
+        settings = self.get_all_settings()
+        address = str(self.address)
+        if settings["Wind"] is not None:
+            layouts.add_settings(address, WIND_RESULT, settings["Wind"])
+        if settings["PTU"] is not None:
+            layouts.add_settings(address, PTU_RESULT, settings["PTU"])
+        if settings["Precipitation"] is not None:
+            layouts.add_settings(address, RAIN_RESULT, settings["Precipitation"])
+        if settings["Supervisor"] is not None:
+            layouts.add_settings(address, STATUS_RESULT, settings["Supervisor"])
+        self.parser = MessageParser(self.parser.has_crc, layouts, self.parser.cache_size)
+        return layouts
+
     def close(self):
         self.ser.close()
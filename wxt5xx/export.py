@@ -0,0 +1,260 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+import os
+import threading
+import time
+
+try:
+    from Queue import Queue, Empty, Full
+except ImportError:
+    from queue import Queue, Empty, Full
+
+from wxt5xx.records import flatten, FIELD_NAMES
+
+
+class LineProtocolEncoder:
+    """Encodes readings as InfluxDB line protocol, one line per reading with nanosecond timestamps."""
+
+    def __init__(self, measurement="wxt5xx"):
+        self.measurement = measurement
+
+    def header(self):
+        return None
+
+    def encode(self, timestamp, address, messages):
+        valid, values, units = flatten(messages)
+        fields = ",".join("%s=%r" % (FIELD_NAMES[i], values[i]) for i in range(len(values)) if valid & (1 << i))
+        if not fields:
+            return None
+        return "%s,station=%s %s %d" % (self.measurement, address, fields, int(timestamp * 1e9))
+
+
+class CSVEncoder:
+    """Encodes readings as CSV rows, invalid or missing values are left empty."""
+
+    def header(self):
+        return ",".join(["timestamp", "station"] + FIELD_NAMES)
+
+    def encode(self, timestamp, address, messages):
+        valid, values, units = flatten(messages)
+        row = [repr(timestamp), str(address)]
+        for i in range(len(values)):
+            row.append(repr(values[i]) if valid & (1 << i) else "")
+        return ",".join(row)
+
+
+class MemorySink:
+    """An in-process sink that keeps the batches it is given, for testing."""
+
+    def __init__(self):
+        self.batches = []
+        self.available = True
+
+    def write(self, lines):
+        if not self.available:
+            raise IOError("Sink unavailable")
+        self.batches.append(list(lines))
+
+    def lines(self):
+        return [line for batch in self.batches for line in batch]
+
+
+class FileSink:
+    """A local stand-in sink that appends each batch to a file."""
+
+    def __init__(self, path, header=None):
+        self.path = path
+        self.header = header
+
+    def write(self, lines):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a") as f:
+            if new and self.header is not None:
+                f.write(self.header + "\n")
+            f.write("".join(line + "\n" for line in lines))
+
+
+class HTTPSink:
+    """Posts each batch to an HTTP write endpoint, such as the InfluxDB /write API."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def write(self, lines):
+        try:
+            from urllib2 import urlopen, Request
+        except ImportError:
+            from urllib.request import urlopen, Request
+        data = "\n".join(lines).encode("utf-8")
+        response = urlopen(Request(self.url, data=data), timeout=self.timeout)
+        response.read()
+        response.close()
+
+
+class ExportPipeline:
+    """Batches readings for a sink and flushes them from a background thread.
+
+    A batch is flushed once it holds batch_size readings or flush_interval
+    seconds after its first reading. The queue holds at most max_queue
+    readings, readings that do not fit are collected into batches of the
+    same size and, like batches the sink rejects, spilled to spill_dir.
+    Spilled readings are sent again, oldest first and merged into batches
+    of up to batch_size, once the sink accepts a batch. Without a
+    spill_dir they are dropped and counted.
+    """
+
+    def __init__(self, sink, encoder, batch_size=500, flush_interval=5.0, max_queue=10000, spill_dir=None, retry_interval=30.0):
+        self.sink = sink
+        self.encoder = encoder
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.retry_interval = retry_interval
+        self.queue = Queue(max_queue)
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(str(ExportPipeline))
+        self.counters = {"Readings": 0, "Batches": 0, "Written": 0, "Spilled": 0, "Dropped": 0}
+        self.next_retry = 0
+        self.spill_sequence = 0
+        self.overflow = []
+        self.overflow_since = None
+        if spill_dir is not None and not os.path.isdir(spill_dir):
+            os.makedirs(spill_dir)
+
+        self.__running = True
+        self.__thread = threading.Thread(target=self.run, name="ExportPipeline")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def submit(self, timestamp, address, messages):
+        """Queues a reading, such as the result of get_all_data, without blocking."""
+        line = self.encoder.encode(timestamp, address, messages)
+        if line is None:
+            return
+        with self.lock:
+            self.counters["Readings"] += 1
+        try:
+            self.queue.put_nowait(line)
+        except Full:
+            with self.lock:
+                if not self.overflow:
+                    self.overflow_since = time.time()
+                self.overflow.append(line)
+                full = len(self.overflow) >= self.batch_size
+            if full:
+                self.spill_overflow()
+
+    def spill_overflow(self):
+        with self.lock:
+            lines = self.overflow
+            self.overflow = []
+            self.overflow_since = None
+        if lines:
+            self.spill(lines)
+
+    def spill(self, lines):
+        with self.lock:
+            if self.spill_dir is None:
+                self.counters["Dropped"] += len(lines)
+                return
+            self.spill_sequence += 1
+            path = os.path.join(self.spill_dir, "%.6f-%06d.spill" % (time.time(), self.spill_sequence))
+            self.counters["Spilled"] += len(lines)
+        with open(path, "w") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+    def spilled(self):
+        if self.spill_dir is None:
+            return []
+        return sorted(os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir) if name.endswith(".spill"))
+
+    def write(self, lines):
+        """Writes a batch to the sink, spilling it on failure, returns True if the sink accepted it."""
+        try:
+            self.sink.write(lines)
+        except Exception as e:
+            self.logger.warning("Sink failed, spilling %s readings: %s" % (len(lines), e))
+            self.next_retry = time.time() + self.retry_interval
+            self.spill(lines)
+            return False
+        with self.lock:
+            self.counters["Batches"] += 1
+            self.counters["Written"] += len(lines)
+        return True
+
+    def resend_spilled(self):
+        """Sends the spilled readings again, merging spill files into batches of up to batch_size."""
+        paths = self.spilled()
+        while paths:
+            batch = []
+            sent = []
+            while paths and len(batch) < self.batch_size:
+                with open(paths[0]) as f:
+                    lines = [line.rstrip("\n") for line in f if line.strip()]
+                if batch and len(batch) + len(lines) > self.batch_size:
+                    break
+                batch.extend(lines)
+                sent.append(paths.pop(0))
+            try:
+                self.sink.write(batch)
+            except Exception as e:
+                self.logger.debug("Sink still unavailable: %s" % e)
+                self.next_retry = time.time() + self.retry_interval
+                return
+            for path in sent:
+                os.remove(path)
+            with self.lock:
+                self.counters["Batches"] += 1
+                self.counters["Written"] += len(batch)
+
+    def run(self):
+        batch = []
+        deadline = None
+        while self.__running or not self.queue.empty() or batch:
+            timeout = 0.1 if deadline is None else max(0, min(0.1, deadline - time.time()))
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.time() + self.flush_interval
+            except Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or time.time() >= deadline or not self.__running):
+                if self.write(batch) and self.spill_dir is not None:
+                    self.resend_spilled()
+                batch = []
+                deadline = None
+            elif not batch and self.spill_dir is not None and time.time() >= self.next_retry and self.spilled():
+                self.resend_spilled()
+
+            if self.overflow_since is not None and (time.time() - self.overflow_since >= self.flush_interval or not self.__running):
+                self.spill_overflow()
+        self.spill_overflow()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["Queued"] = self.queue.qsize()
+        return stats
+
+    def close(self):
+        """Flushes the queued readings and stops the background thread."""
+        self.__running = False
+        self.__thread.join()
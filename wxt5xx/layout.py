@@ -0,0 +1,187 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+from wxt5xx.message import BaseMessageParser, WindDataMessageParser, PTUDataMessageParser, RainDataMessageParser, \
+    StatusMessageParser, WIND_RESULT, PTU_RESULT, RAIN_RESULT, STATUS_RESULT
+
+# The order the fields of each data message are sent in.
+MESSAGE_ORDER = {
+    WIND_RESULT: ["Dn", "Dm", "Dx", "Sn", "Sm", "Sx"],
+    PTU_RESULT: ["Ta", "Tp", "Ua", "Pa"],
+    RAIN_RESULT: ["Rc", "Rd", "Ri", "Hc", "Hd", "Hi", "Rp", "Hp"],
+    STATUS_RESULT: ["Th", "Vh", "Vs", "Vr", "Id"],
+}
+
+FIELD = "Field"
+LIMIT = "Limit"
+VOLTAGE = "Voltage"
+STATUS = "Status"
+
+# Where the data message parsers place each field:
+#   result: (type, containers, lists, {label: [(container, key, kind)]})
+# a container of None is the Data dict itself, lists are the (container, key, labels)
+# of the list valued fields, always present like the generic parsers make them.
+TARGETS = {
+    WIND_RESULT: ("Wind", ["Speed", "Direction"], [("Speed", "Limits", ["Sn", "Sx"]), ("Direction", "Limits", ["Dn", "Dx"])], {
+        "Sm": [("Speed", "Average", FIELD)],
+        "Sn": [("Speed", "Limits", LIMIT)],
+        "Sx": [("Speed", "Limits", LIMIT)],
+        "Dm": [("Direction", "Average", FIELD)],
+        "Dn": [("Direction", "Limits", LIMIT)],
+        "Dx": [("Direction", "Limits", LIMIT)],
+    }),
+    PTU_RESULT: ("PTU", ["Temperature"], [], {
+        "Ta": [("Temperature", "Ambient", FIELD)],
+        "Tp": [("Temperature", "Internal", FIELD)],
+        "Ua": [(None, "Humidity", FIELD)],
+        "Pa": [(None, "Pressure", FIELD)],
+    }),
+    RAIN_RESULT: ("Rain", ["Rain", "Hail"], [], {
+        "Ri": [("Rain", "Intensity", FIELD)],
+        "Rp": [("Rain", "Peak", FIELD)],
+        "Rc": [("Rain", "Accumulation", FIELD)],
+        "Rd": [("Rain", "Duration", FIELD)],
+        "Hi": [("Hail", "Intensity", FIELD)],
+        "Hp": [("Hail", "Peak", FIELD)],
+        "Hc": [("Hail", "Accumulation", FIELD)],
+        "Hd": [("Hail", "Duration", FIELD)],
+    }),
+    STATUS_RESULT: ("Status", ["Voltages", "Heating"], [], {
+        "Vs": [("Voltages", "Supply", FIELD)],
+        "Vr": [("Voltages", "Reference", FIELD)],
+        "Vh": [("Voltages", "Heating", VOLTAGE), ("Heating", "Status", STATUS)],
+        "Th": [("Heating", "Temperature", FIELD)],
+    }),
+}
+
+
+class CompiledLayout:
+    """Parses one data message type whose fields are known in advance.
+
+    The field at each position is checked against the expected label and
+    its unit is looked up from a per position cache filled by parse_unit,
+    parse returns None when the message does not match the layout.
+    """
+
+    def __init__(self, result, labels, unit_parser):
+        self.result = result
+        self.labels = list(labels)
+        self.length = len(self.labels) + 1
+        self.unit_parser = unit_parser
+        self.type, self.containers, lists, targets = TARGETS[result]
+
+        self.lists = []
+        list_index = {}
+        for container, key, members in lists:
+            present = [label for label in members if label in self.labels]
+            self.lists.append((container, key, len(present)))
+            for i in range(len(present)):
+                list_index[present[i]] = i
+
+        self.fields = []
+        for label in self.labels:
+            self.fields.append((label + "=", len(label) + 1, [
+                (container, key, kind, list_index.get(label)) for container, key, kind in targets.get(label, [])
+            ], {}))
+
+    def parse(self, message):
+        values = message.split(",")
+        if len(values) != self.length or values[0] != self.result:
+            return None
+
+        data = {}
+        for container in self.containers:
+            data[container] = {}
+        for container, key, length in self.lists:
+            data[container][key] = [None] * length
+
+        for i in range(len(self.fields)):
+            prefix, start, targets, units = self.fields[i]
+            field = values[i + 1]
+            if not field.startswith(prefix):
+                return None
+            if not targets:
+                continue
+            unit_chr = field[-1]
+            unit = units.get(unit_chr)
+            if unit is None:
+                unit = units[unit_chr] = self.unit_parser.parse_unit(field)[1]
+            value = field[start:-1]
+            for container, key, kind, index in targets:
+                target = data if container is None else data[container]
+                if kind == FIELD:
+                    target[key] = [value, unit]
+                elif kind == LIMIT:
+                    target[key][index] = [value, unit]
+                elif kind == VOLTAGE:
+                    target[key] = [value, "V"]
+                elif kind == STATUS:
+                    target[key] = unit
+
+        return {"Type": self.type, "Data": data}
+
+
+class LayoutMessageParser(BaseMessageParser):
+    """Fast path for the data messages of stations whose field layout is known.
+
+    A layout is compiled per address and message type, either from the
+    settings read from the device with add_settings, or learned from the
+    first message the generic parser accepts. Messages that do not match
+    their layout are parsed by the generic parser and the layout is
+    learned again.
+    """
+
+    generic = {
+        WIND_RESULT: WindDataMessageParser(),
+        PTU_RESULT: PTUDataMessageParser(),
+        RAIN_RESULT: RainDataMessageParser(),
+        STATUS_RESULT: StatusMessageParser()
+    }
+
+    def __init__(self, learn=True):
+        BaseMessageParser.__init__(self)
+        self.learn = learn
+        self.layouts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add_layout(self, address, result, labels):
+        self.layouts[(address, result)] = CompiledLayout(result, labels, self)
+
+    def add_settings(self, address, result, settings):
+        """Compiles the layout of result from the Requested fields of its settings."""
+        requested = settings['R']['Requested']
+        self.add_layout(address, result, [label for label in MESSAGE_ORDER[result] if requested.get(label)])
+
+    def parse(self, address, message):
+        result = message[:2]
+        if result not in self.generic:
+            return None
+
+        layout = self.layouts.get((address, result))
+        if layout is not None:
+            parsed = layout.parse(message)
+            if parsed is not None:
+                self.hits += 1
+                return parsed
+
+        self.misses += 1
+        parsed = self.generic[result].parse(address, message)
+        if parsed is not None and self.learn:
+            self.logger.debug("Learning layout of %s%s" % (address, result))
+            self.add_layout(address, result, [field.split("=")[0] for field in message.split(",")[1:]])
+        return parsed
@@ -0,0 +1,212 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+import threading
+import time
+
+from wxt5xx.client import port_lock, LockedWXT5xx
+from wxt5xx.comms import WXT5xx
+from wxt5xx.message import CommunicationProtocol
+
+
+class StationUnavailable(Exception):
+    pass
+
+
+class Station:
+    """The connection state of one weather station.
+
+    The url is anything understood by serial.serial_for_url, a device such
+    as /dev/ttyUSB0 or socket://host:port for a serial to Ethernet bridge.
+    The lock is held while the station is checked, connected or
+    disconnected, so only one thread at a time changes its state.
+    """
+
+    def __init__(self, name, url, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC, **serial_config):
+        self.name = name
+        self.url = url
+        self.address = address
+        self.protocol = protocol
+        self.serial_config = serial_config
+
+        self.lock = threading.RLock()
+        self.device = None
+        self.client = None
+        self.connected = False
+        self.failures = 0
+        self.next_attempt = 0
+        self.last_check = 0
+        self.checks = 0
+        self.successes = 0
+        self.latency = None
+        self.last_error = None
+
+    def availability(self):
+        if self.checks == 0:
+            return None
+        return float(self.successes) / self.checks
+
+    def status(self):
+        return {
+            "Connected": self.connected,
+            "Availability": self.availability(),
+            "Latency": self.latency,
+            "Failures": self.failures,
+            "Last Error": self.last_error
+        }
+
+
+class StationManager:
+    """Keeps a pool of open transports to a fleet of stations.
+
+    Stations are health checked with a connection info request, a station
+    that fails is closed and reconnected with an exponential backoff. The
+    handshake is only performed on the first connection, a reconnect
+    reuses the address and protocol of the existing WXT5xx.
+    """
+
+    def __init__(self, health_interval=60, backoff=1.0, max_backoff=300, latency_weight=0.2):
+        self.health_interval = health_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_weight = latency_weight
+        self.stations = {}
+        self.logger = logging.getLogger(str(StationManager))
+        self.__running = threading.Event()
+        self.__thread = None
+
+    def add_station(self, name, url, address=None, protocol=CommunicationProtocol.ASCII_Polled_CRC, **serial_config):
+        station = Station(name, url, address, protocol, **serial_config)
+        self.stations[name] = station
+        return station
+
+    def open_transport(self, station):
+        from serial import serial_for_url
+        return serial_for_url(station.url, **station.serial_config)
+
+    def connect(self, station):
+        ser = self.open_transport(station)
+        try:
+            if station.device is None:
+                station.device = WXT5xx(ser, address=station.address, protocol=station.protocol)
+                station.client = LockedWXT5xx(station.device)
+                station.address = station.device.address
+            else:
+                with port_lock(station.device.ser):
+                    station.device.reconnect(ser)
+        except Exception:
+            ser.close()
+            raise
+        station.connected = True
+
+    def disconnect(self, station, error):
+        self.logger.warning("Station %s failed: %s" % (station.name, error))
+        station.connected = False
+        station.failures += 1
+        station.last_error = str(error)
+        station.next_attempt = time.time() + min(self.backoff * 2 ** (station.failures - 1), self.max_backoff)
+        if station.device is not None:
+            # Under the port lock so a LockedWXT5xx caller finishes its exchange first.
+            try:
+                with port_lock(station.device.ser):
+                    station.device.close()
+            except Exception as e:
+                self.logger.debug("Error closing station %s: %s" % (station.name, e))
+
+    def check(self, station):
+        """Health checks a station, reconnecting it if it is due, returns True if it is available."""
+        with station.lock:
+            return self.__check(station)
+
+    def __check(self, station):
+        now = time.time()
+        if not station.connected:
+            if now < station.next_attempt:
+                return False
+            try:
+                self.connect(station)
+            except Exception as e:
+                station.checks += 1
+                self.disconnect(station, e)
+                return False
+
+        station.checks += 1
+        station.last_check = now
+        try:
+            with port_lock(station.device.ser):
+                start = time.time()
+                station.device.get_connection_info()
+                latency = time.time() - start
+        except Exception as e:
+            self.disconnect(station, e)
+            return False
+
+        if station.latency is None:
+            station.latency = latency
+        else:
+            station.latency += self.latency_weight * (latency - station.latency)
+        station.successes += 1
+        station.failures = 0
+        return True
+
+    def check_due(self):
+        now = time.time()
+        for station in list(self.stations.values()):
+            with station.lock:
+                if station.connected and now - station.last_check < self.health_interval:
+                    continue
+                self.__check(station)
+
+    def get(self, name):
+        """Returns the WXT5xx of a station, connecting it if required.
+
+        The WXT5xx is wrapped in a LockedWXT5xx, so calls from the caller's
+        thread and the background health checks take turns on the port.
+        """
+        station = self.stations[name]
+        with station.lock:
+            if not station.connected and not self.__check(station):
+                raise StationUnavailable("Station %s is unavailable: %s" % (name, station.last_error))
+            return station.client
+
+    def report(self):
+        return dict((name, station.status()) for name, station in self.stations.items())
+
+    def start(self, period=1.0):
+        """Runs the health checks from a background thread."""
+        self.__running.set()
+
+        def run():
+            while self.__running.is_set():
+                self.check_due()
+                time.sleep(period)
+
+        self.__thread = threading.Thread(target=run, name="StationManager")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def close(self):
+        self.__running.clear()
+        if self.__thread is not None:
+            self.__thread.join()
+        for station in self.stations.values():
+            with station.lock:
+                if station.connected:
+                    with port_lock(station.device.ser):
+                        station.device.close()
+                    station.connected = False
@@ -16,6 +16,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 import logging
+from collections import OrderedDict
 
 SDI12_COMMAND_TERM = "!"
 ASCII_COMMAND_TERM = "\r\n"
@@ -32,6 +33,7 @@ WIND_RESULT = "r1"
 PTU_RESULT = "r2"
 RAIN_RESULT = "r3"
 STATUS_RESULT = "r5"
+DATA_RESULTS = [WIND_RESULT, PTU_RESULT, RAIN_RESULT, STATUS_RESULT]
 
 ASCII_CONNECTION_INFO = b'xU'
 SDI12_CONNECTION_INFO = b'XXU'
@@ -430,6 +432,13 @@ class PTUSettingsMessageParser(SettingsMessageParser):
         self.message = ASCII_PTU_SETTINGS
 
 
+class WindSettingsMessageParser(SettingsMessageParser):
+    def __init__(self):
+        SettingsMessageParser.__init__(self)
+        self.order = ["Dn", "Dm", "Dx", "Sn", "Sm", "Sx"]
+        self.message = ASCII_WIND_SETTINGS
+
+
 class PrecipationSettingsMessageParser(SettingsMessageParser):
     def __init__(self):
         SettingsMessageParser.__init__(self)
@@ -443,21 +452,48 @@ class SupervisorSettingsMessageParser(SettingsMessageParser):
         self.message = ASCII_SUPERVISOR_SETTINGS
         self.ignore=['a', 'b', 'c','d','e','f', 'g', 'h', 'j', 'k']
 
+def copy_result(value):
+    """Copies a parsed result, only its dicts and lists are copied, the strings they hold are shared."""
+    if isinstance(value, dict):
+        return dict((key, copy_result(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [copy_result(item) for item in value]
+    return value
+
+
 class MessageParser:
-    parsers = [
-        WindDataMessageParser(),
-        PTUDataMessageParser(),
-        RainDataMessageParser(),
-        StatusMessageParser(),
-        CommsMessageParser(),
-        CommandResponseMessageParser(),
-        PTUSettingsMessageParser(),
-        PrecipationSettingsMessageParser(),
-        SupervisorSettingsMessageParser()
-    ]
-
-    def __init__(self, has_crc):
+    parsers = None
+
+    @staticmethod
+    def default_parsers():
+        # Built on first use rather than at import.
+        if MessageParser.parsers is None:
+            MessageParser.parsers = [
+                WindDataMessageParser(),
+                PTUDataMessageParser(),
+                RainDataMessageParser(),
+                StatusMessageParser(),
+                CommsMessageParser(),
+                CommandResponseMessageParser(),
+                PTUSettingsMessageParser(),
+                WindSettingsMessageParser(),
+                PrecipationSettingsMessageParser(),
+                SupervisorSettingsMessageParser()
+            ]
+        return MessageParser.parsers
+
+    def __init__(self, has_crc, layouts=None, cache_size=0):
+        """cache_size > 0 keeps the results of that many distinct frames, a repeated frame is
+        answered with a copy of its cached result instead of being checked and parsed again."""
         self.has_crc = has_crc
+        self.layouts = layouts
+        self.parsers = MessageParser.default_parsers()
+        if layouts is not None:
+            self.parsers = [layouts] + self.parsers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
         self.logger = logging.getLogger(str(MessageParser))
 
     def check_crc(self, message):
@@ -465,6 +501,27 @@ class MessageParser:
         return message[:-3], crc16(message[:-3]) == message[-3:]
 
     def parse_message(self, message):
+        if self.cache_size <= 0:
+            return self.parse_frame(message)
+
+        key = message.strip()
+        result = self.cache.pop(key, None)
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = self.parse_frame(message)
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+        self.cache[key] = result
+        return copy_result(result)
+
+    def cache_stats(self):
+        lookups = self.hits + self.misses
+        return {"Hits": self.hits, "Misses": self.misses, "Size": len(self.cache),
+                "HitRate": float(self.hits) / lookups if lookups else None}
+
+    def parse_frame(self, message):
         if self.has_crc:
             message, result = self.check_crc(message)
         else:
@@ -513,6 +570,22 @@ class Message:
     def read_all_data(self):
         return self.address + ASCII_READ_DATA + self.term
 
+    def read_data(self, result):
+        """Requests a single message type, result is one of WIND_RESULT, PTU_RESULT, RAIN_RESULT or STATUS_RESULT."""
+        return self.address + ASCII_READ_DATA + result[1:] + self.term
+
+    def read_wind_data(self):
+        return self.read_data(WIND_RESULT)
+
+    def read_ptu_data(self):
+        return self.read_data(PTU_RESULT)
+
+    def read_rain_data(self):
+        return self.read_data(RAIN_RESULT)
+
+    def read_status_data(self):
+        return self.read_data(STATUS_RESULT)
+
     def reset(self):
         return self.checksum(self.address + ASCII_RESET) + self.term
 
@@ -554,6 +627,12 @@ class Message:
         # ) + self.term
         return self.__set_settings(settings, PTUSettingsMessageParser())
 
+    def get_wind_settings(self):
+        return self.__get_settings(WindSettingsMessageParser())
+
+    def set_wind_settings(self, settings):
+        return self.__set_settings(settings, WindSettingsMessageParser())
+
     def get_precipitation_settings(self):
         # return self.checksum(self.address + ASCII_PRECIPITATION_SETTINGS) + self.term
         return self.__get_settings(PrecipationSettingsMessageParser())
@@ -0,0 +1,211 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+import time
+
+try:
+    import selectors
+except ImportError:
+    import selectors34 as selectors
+
+from wxt5xx.comms import PendingRequest, match_reply
+from wxt5xx.message import MessageParser, ASCIIMessage
+
+
+class FrameDecoder:
+    """Splits the bytes read from a port into complete lines."""
+
+    def __init__(self, max_length=1024):
+        self.buffer = b''
+        self.max_length = max_length
+
+    def feed(self, data):
+        self.buffer += data
+        lines = self.buffer.split(b'\n')
+        self.buffer = lines.pop()
+        if len(self.buffer) > self.max_length:
+            # No line ending in sight, the port is out of sync.
+            self.buffer = b''
+        return [line.strip() for line in lines if line.strip()]
+
+
+class PolledPort:
+    """The polling state of one port driven by a Multiplexer."""
+
+    def __init__(self, name, ser, messages, interval, callback, parser, has_checksum, timeout):
+        self.name = name
+        self.ser = ser
+        self.messages = messages
+        self.interval = interval
+        self.callback = callback
+        self.parser = parser
+        self.has_checksum = has_checksum
+        self.timeout = timeout
+
+        self.decoder = FrameDecoder()
+        self.outgoing = b''
+        self.pending = None
+        self.deadline = None
+        self.next_due = time.time()
+        self.counters = {"Polls": 0, "Completed": 0, "Timeouts": 0, "Overruns": 0, "Errors": 0}
+
+    def fileno(self):
+        return self.ser.fileno()
+
+
+class Multiplexer:
+    """Polls many ports from a single thread with a selector.
+
+    Every port is put in non-blocking mode, its poll messages are written
+    and its replies read as the selector reports the port ready. Lines are
+    matched to the outstanding requests like WXT5xx.pipeline does and the
+    callback is called with (port name, results) once every reply arrived
+    or the port's timeout expired, results has None in unanswered slots.
+    Polls are scheduled on a fixed cadence from the first poll so a slow
+    port does not drift the others, a poll that is due while the previous
+    one is outstanding is skipped and counted as an overrun.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.ports = {}
+        self.logger = logging.getLogger(str(Multiplexer))
+
+    def add_port(self, name, ser, address, interval, callback, messages=None, has_crc=True, timeout=2.0):
+        """Adds a port, messages are the poll requests and default to reading all data from address."""
+        if messages is None:
+            messages = [ASCIIMessage(address, has_crc).read_all_data()]
+        ser.timeout = 0
+        ser.write_timeout = 0
+        port = PolledPort(name, ser, messages, interval, callback, MessageParser(has_crc), has_crc, timeout)
+        self.ports[name] = port
+        self.selector.register(port, selectors.EVENT_READ, port)
+        return port
+
+    def add_device(self, name, device, interval, callback, messages=None, timeout=2.0):
+        """Adds the port of a WXT5xx whose handshake is done, reusing its address, protocol and parser."""
+        if messages is None:
+            messages = [device.protocol.read_all_data()]
+        port = self.add_port(name, device.ser, device.address, interval, callback, messages, device.parser.has_crc, timeout)
+        port.parser = device.parser
+        return port
+
+    def remove_port(self, name):
+        port = self.ports.pop(name)
+        self.selector.unregister(port)
+
+    def __events(self, port):
+        return selectors.EVENT_READ | (selectors.EVENT_WRITE if port.outgoing else 0)
+
+    def __poll(self, port, now):
+        while port.next_due <= now:
+            port.next_due += port.interval
+        if port.pending is not None:
+            port.counters["Overruns"] += 1
+            return
+        port.counters["Polls"] += 1
+        port.pending = [PendingRequest(message, port.has_checksum) for message in port.messages]
+        port.deadline = now + port.timeout
+        port.outgoing += b''.join(port.messages)
+        self.selector.modify(port, self.__events(port), port)
+
+    def __complete(self, port):
+        results = [request.result() for request in port.pending]
+        port.pending = None
+        port.deadline = None
+        try:
+            port.callback(port.name, results)
+        except Exception as e:
+            self.logger.exception("Callback for %s failed: %s" % (port.name, e))
+
+    def __write(self, port):
+        try:
+            written = port.ser.write(port.outgoing)
+            port.outgoing = port.outgoing[written:]
+        except Exception as e:
+            port.counters["Errors"] += 1
+            self.logger.warning("Write to %s failed: %s" % (port.name, e))
+            port.outgoing = b''
+        if not port.outgoing:
+            self.selector.modify(port, self.__events(port), port)
+
+    def __read(self, port):
+        try:
+            data = port.ser.read(max(1, port.ser.in_waiting))
+        except Exception as e:
+            port.counters["Errors"] += 1
+            self.logger.warning("Read from %s failed: %s" % (port.name, e))
+            return
+        for line in port.decoder.feed(data):
+            if port.pending is None:
+                self.logger.debug("Unsolicited message on %s: %s" % (port.name, line))
+                continue
+            try:
+                request, prefix = match_reply(port.pending, line, port.parser.has_crc)
+            except Exception as e:
+                port.counters["Errors"] += 1
+                self.logger.warning("Could not match %r on %s: %s" % (line, port.name, e))
+                continue
+            if request is None:
+                self.logger.warning("Unexpected message on %s: %r" % (port.name, line))
+                continue
+            # A reply that fails to parse still answers its request, with None.
+            try:
+                request.replies[prefix] = port.parser.parse_message(line)
+            except Exception as e:
+                port.counters["Errors"] += 1
+                self.logger.warning("Could not parse %s on %s: %s" % (line, port.name, e))
+                request.replies[prefix] = None
+            if all(r.is_complete() for r in port.pending):
+                port.counters["Completed"] += 1
+                self.__complete(port)
+
+    def run_once(self, max_wait=1.0):
+        now = time.time()
+        wake = now + max_wait
+        for port in list(self.ports.values()):
+            if port.deadline is not None and port.deadline <= now:
+                port.counters["Timeouts"] += 1
+                self.logger.warning("Timed out polling %s" % port.name)
+                self.__complete(port)
+            if port.next_due <= now:
+                self.__poll(port, now)
+            wake = min(wake, port.next_due)
+            if port.deadline is not None:
+                wake = min(wake, port.deadline)
+
+        for key, events in self.selector.select(max(0, wake - time.time())):
+            port = key.data
+            if events & selectors.EVENT_WRITE:
+                self.__write(port)
+            if events & selectors.EVENT_READ:
+                self.__read(port)
+
+    def run(self, running=lambda: True):
+        while running():
+            self.run_once()
+
+    def stats(self):
+        return dict((name, dict(port.counters)) for name, port in self.ports.items())
+
+    def close(self):
+        for name in list(self.ports.keys()):
+            port = self.ports[name]
+            self.remove_port(name)
+            port.ser.close()
+        self.selector.close()
@@ -0,0 +1,202 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from wxt5xx.aggregate import value_of
+from wxt5xx.records import FIELDS, lookup_field
+from wxt5xx.units import CONVERSIONS, normalise
+
+# QC flags, a reading's flags are the OR of the checks it failed, 0 when it passed.
+RANGE = 1
+SPIKE = 2
+STUCK = 4
+FLAG_NAMES = [(RANGE, "Range"), (SPIKE, "Spike"), (STUCK, "Stuck")]
+
+
+def flag_names(flags):
+    return [name for flag, name in FLAG_NAMES if flags & flag]
+
+
+class Check:
+    """The limits of one field, in the SI units of units.CONVERSIONS.
+
+    A value outside [minimum, maximum] fails the range check, one that
+    changed faster than max_rate per second since the previous value fails
+    the spike check and one that has not changed for stuck seconds fails
+    the stuck check, unless it is stuck_exempt such as a calm wind speed.
+    Readings more than max_gap seconds apart are not spike checked.
+    """
+
+    def __init__(self, minimum, maximum, max_rate=None, stuck=None, stuck_exempt=None, max_gap=600.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_rate = max_rate
+        self.stuck = stuck
+        self.stuck_exempt = stuck_exempt
+        self.max_gap = max_gap
+
+
+# Defaults from the WXT530 series measurement ranges.
+CHECKS = {
+    "Sm": Check(0.0, 60.0, max_rate=10.0, stuck=3600.0, stuck_exempt=0.0),
+    "Sx": Check(0.0, 75.0, max_rate=30.0, stuck=3600.0, stuck_exempt=0.0),
+    "Dm": Check(0.0, 360.0, stuck=6 * 3600.0),
+    "Ta": Check(-52.0, 60.0, max_rate=0.1, stuck=6 * 3600.0),
+    "Ua": Check(0.0, 100.0, max_rate=1.0, stuck=6 * 3600.0, stuck_exempt=100.0),
+    "Pa": Check(60000.0, 110000.0, max_rate=10.0, stuck=6 * 3600.0),
+    "Th": Check(-52.0, 80.0, max_rate=1.0),
+    "Vh": Check(0.0, 32.0),
+}
+
+
+def si_value(field):
+    value = value_of(field)
+    if value is None or field[1] not in CONVERSIONS:
+        return value
+    target, scale, offset = CONVERSIONS[field[1]]
+    return value * scale + offset
+
+
+class FieldState:
+    def __init__(self):
+        self.time = None
+        self.value = None
+        self.since = None
+
+
+class QualityControl:
+    """Tags parsed data messages with QC flags as they arrive.
+
+    Only the previous value, its time and the time it was first seen are
+    kept for each station and field, so checking is O(1) per reading.
+    Readings are never dropped, check adds {"QC": {field: flags}} to the
+    message for every checked field it holds.
+    """
+
+    def __init__(self, checks=None):
+        self.checks = CHECKS if checks is None else checks
+        self.states = {}
+        self.counters = dict((name, 0) for flag, name in FLAG_NAMES)
+        self.counters["Checked"] = 0
+        self.fields = {}
+        for label, kind, path in FIELDS:
+            if label in self.checks:
+                self.fields.setdefault(kind, []).append((label, path))
+
+    def check_value(self, address, label, timestamp, value):
+        check = self.checks[label]
+        state = self.states.get((address, label))
+        if state is None:
+            state = self.states[(address, label)] = FieldState()
+
+        flags = 0
+        if value < check.minimum or value > check.maximum:
+            flags |= RANGE
+        if state.time is not None:
+            dt = timestamp - state.time
+            if check.max_rate is not None and 0 < dt <= check.max_gap and abs(value - state.value) > check.max_rate * dt:
+                flags |= SPIKE
+        if state.value != value:
+            state.since = timestamp
+        elif check.stuck is not None and value != check.stuck_exempt and timestamp - state.since >= check.stuck:
+            flags |= STUCK
+        state.time = timestamp
+        state.value = value
+
+        self.counters["Checked"] += 1
+        for flag, name in FLAG_NAMES:
+            if flags & flag:
+                self.counters[name] += 1
+        return flags
+
+    def check(self, address, message, timestamp=None):
+        """Checks a message from MessageParser.parse_message, returns the message."""
+        if not isinstance(message, dict) or message.get("Type") not in self.fields:
+            return message
+        if timestamp is None:
+            timestamp = time.time()
+        qc = {}
+        for label, path in self.fields[message["Type"]]:
+            value = si_value(lookup_field(message, path))
+            if value is not None:
+                qc[label] = self.check_value(address, label, timestamp, value)
+        message["QC"] = qc
+        return message
+
+    def stats(self):
+        return dict(self.counters)
+
+
+class QualityControlParser:
+    """Wraps a MessageParser so every parsed message is tagged by a QualityControl."""
+
+    def __init__(self, parser, qc=None):
+        self.parser = parser
+        self.qc = QualityControl() if qc is None else qc
+
+    def __getattr__(self, name):
+        return getattr(self.parser, name)
+
+    def parse_message(self, message, timestamp=None):
+        return self.qc.check(message.strip()[0], self.parser.parse_message(message), timestamp)
+
+
+def check_columns(result, checks=None):
+    """The vectorised form of QualityControl for reprocessing stored readings, requires numpy.
+
+    result is the columnar result of RecordStore.query for one station, it
+    is normalised to SI units. Returns {field: flags column}, the same flags
+    QualityControl would have given the readings in timestamp order.
+    """
+    if checks is None:
+        checks = CHECKS
+    result = normalise(result)
+    timestamps = numpy.asarray(result["Data"]["timestamp"], dtype=numpy.float64)
+    flags = {}
+    for label in result["Data"]:
+        if label not in checks:
+            continue
+        check = checks[label]
+        values = numpy.asarray(result["Data"][label], dtype=numpy.float64)
+        column = numpy.zeros(len(values), dtype=numpy.uint8)
+        rows = numpy.nonzero(numpy.isfinite(values))[0]
+        v = values[rows]
+        t = timestamps[rows]
+        f = numpy.zeros(len(rows), dtype=numpy.uint8)
+
+        f[(v < check.minimum) | (v > check.maximum)] |= RANGE
+        if len(rows) > 1 and check.max_rate is not None:
+            dt = numpy.diff(t)
+            spikes = (dt > 0) & (dt <= check.max_gap) & (numpy.abs(numpy.diff(v)) > check.max_rate * dt)
+            f[1:][spikes] |= SPIKE
+        if len(rows) and check.stuck is not None:
+            changed = numpy.concatenate([[True], v[1:] != v[:-1]])
+            start = numpy.maximum.accumulate(numpy.where(changed, numpy.arange(len(v)), 0))
+            stuck = t - t[start] >= check.stuck
+            if check.stuck_exempt is not None:
+                stuck &= v != check.stuck_exempt
+            f[stuck] |= STUCK
+
+        column[rows] = f
+        flags[label] = column
+    return flags
@@ -0,0 +1,306 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import json
+import logging
+import os
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from wxt5xx.message import MessageParser
+
+# A record file is a fixed size header followed by fixed size records:
+#   header:  magic, version, length of the JSON field/unit table, the table, zero padding
+#   record:  timestamp (float64), address (uint8), valid (uint32), one float32 per field
+# all little endian without padding so the records can be read with numpy.fromfile or
+# numpy.memmap with offset=HEADER_SIZE.
+
+MAGIC = b'WXTR'
+VERSION = 1
+HEADER_SIZE = 1024
+HEADER_FORMAT = "<4sHH"
+
+# (label, message type, path to the [value, unit] field in the parsed message)
+FIELDS = [
+    ("Dn", "Wind", ("Direction", "Limits", 0)),
+    ("Dm", "Wind", ("Direction", "Average")),
+    ("Dx", "Wind", ("Direction", "Limits", 1)),
+    ("Sn", "Wind", ("Speed", "Limits", 0)),
+    ("Sm", "Wind", ("Speed", "Average")),
+    ("Sx", "Wind", ("Speed", "Limits", 1)),
+    ("Ta", "PTU", ("Temperature", "Ambient")),
+    ("Tp", "PTU", ("Temperature", "Internal")),
+    ("Ua", "PTU", ("Humidity",)),
+    ("Pa", "PTU", ("Pressure",)),
+    ("Rc", "Rain", ("Rain", "Accumulation")),
+    ("Rd", "Rain", ("Rain", "Duration")),
+    ("Ri", "Rain", ("Rain", "Intensity")),
+    ("Rp", "Rain", ("Rain", "Peak")),
+    ("Hc", "Rain", ("Hail", "Accumulation")),
+    ("Hd", "Rain", ("Hail", "Duration")),
+    ("Hi", "Rain", ("Hail", "Intensity")),
+    ("Hp", "Rain", ("Hail", "Peak")),
+    ("Th", "Status", ("Heating", "Temperature")),
+    ("Vh", "Status", ("Voltages", "Heating")),
+    ("Vs", "Status", ("Voltages", "Supply")),
+    ("Vr", "Status", ("Voltages", "Reference")),
+]
+FIELD_NAMES = [field[0] for field in FIELDS]
+
+RECORD_FORMAT = "<dBI" + "f" * len(FIELDS)
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+
+def record_dtype():
+    """The numpy dtype of a record, requires numpy."""
+    return numpy.dtype([("timestamp", "<f8"), ("address", "u1"), ("valid", "<u4")] +
+                       [(name, "<f4") for name in FIELD_NAMES])
+
+
+def lookup_field(message, path):
+    value = message['Data']
+    try:
+        for key in path:
+            value = value[key]
+    except (KeyError, IndexError):
+        return None
+    return value
+
+
+def flatten(messages):
+    """Flattens parsed data messages into (valid, values, units) in FIELDS order.
+
+    Fields that are missing or reported invalid ('#') are NaN with their
+    valid bit cleared.
+    """
+    by_type = dict((message['Type'], message) for message in messages if message is not None)
+    valid = 0
+    values = []
+    units = []
+    for i in range(len(FIELDS)):
+        label, kind, path = FIELDS[i]
+        field = None
+        if kind in by_type:
+            field = lookup_field(by_type[kind], path)
+        value = float("nan")
+        unit = None
+        if field is not None and field[1] != 'invalid':
+            try:
+                value = float(field[0])
+                unit = field[1]
+                valid |= 1 << i
+            except ValueError:
+                pass
+        values.append(value)
+        units.append(unit)
+    return valid, values, units
+
+
+def address_code(address):
+    """The byte a station address is stored as, the ASCII code of its address character.
+
+    The int addresses of WXT5xx and the characters leading a frame encode the same way.
+    """
+    if isinstance(address, bytes) and not isinstance(address, str):
+        address = address.decode("ascii")
+    address = str(address)
+    if len(address) != 1:
+        raise ValueError("Invalid station address: %s" % address)
+    return ord(address)
+
+
+def read_header(f):
+    magic, version, length = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+    if magic != MAGIC:
+        raise ValueError("Not a WXT5xx record file")
+    if version != VERSION:
+        raise ValueError("Unsupported record file version: %s" % version)
+    table = json.loads(f.read(length).decode("utf-8"))
+    if table["Fields"] != FIELD_NAMES:
+        raise ValueError("Record file fields do not match: %s" % table["Fields"])
+    return table["Units"]
+
+
+def write_header(f, units):
+    table = json.dumps({"Fields": FIELD_NAMES, "Units": units}).encode("utf-8")
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(table)) + table
+    if len(header) > HEADER_SIZE:
+        raise ValueError("Record header too large")
+    f.seek(0)
+    f.write(header + b'\0' * (HEADER_SIZE - len(header)))
+    f.flush()
+
+
+class RecordWriter:
+    """Appends readings to a record file.
+
+    Rows are buffered and written a batch at a time, or only when flushed
+    when batch_size is None. The units of each field
+    are taken from the first valid reading and kept in the header, a reading
+    whose units disagree with the header raises a ValueError.
+    """
+
+    def __init__(self, path, batch_size=1024):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+        self.logger = logging.getLogger(str(RecordWriter))
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            self.f = open(path, "r+b")
+            self.units = read_header(self.f)
+            self.f.seek(0, os.SEEK_END)
+            if (self.f.tell() - HEADER_SIZE) % RECORD_SIZE != 0:
+                raise ValueError("Record file %s has a partial record" % path)
+        else:
+            self.f = open(path, "w+b")
+            self.units = [None] * len(FIELDS)
+            write_header(self.f, self.units)
+        self.units_changed = False
+
+    def append(self, timestamp, address, messages):
+        """Appends one reading, messages is a list of parsed data messages such as the result of get_all_data."""
+        valid, values, units = flatten(messages)
+        code = address_code(address)
+        for i in range(len(units)):
+            if units[i] is not None and self.units[i] is not None and self.units[i] != units[i]:
+                raise ValueError("Unit of %s changed from %s to %s" % (FIELD_NAMES[i], self.units[i], units[i]))
+        for i in range(len(units)):
+            if units[i] is not None and self.units[i] is None:
+                self.units[i] = units[i]
+                self.units_changed = True
+        self.rows.append(tuple([timestamp, code, valid] + values))
+        if self.batch_size is not None and len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.units_changed:
+            write_header(self.f, self.units)
+            self.units_changed = False
+        self.f.seek(0, os.SEEK_END)
+        if self.rows:
+            if numpy is not None:
+                numpy.array(self.rows, dtype=record_dtype()).tofile(self.f)
+            else:
+                self.f.write(b''.join(struct.pack(RECORD_FORMAT, *row) for row in self.rows))
+            self.rows = []
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class RecordReader:
+    """Reads a record file, as a numpy memmap when numpy is available."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.units = read_header(f)
+        self.count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+
+    def read(self):
+        if numpy is not None:
+            if self.count == 0:
+                return numpy.zeros(0, dtype=record_dtype())
+            return numpy.memmap(self.path, dtype=record_dtype(), mode="r", offset=HEADER_SIZE, shape=(self.count,))
+        return list(self)
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            f.seek(HEADER_SIZE)
+            for i in range(self.count):
+                yield struct.unpack(RECORD_FORMAT, f.read(RECORD_SIZE))
+
+    def as_dict(self, row):
+        valid = row[2]
+        result = {"timestamp": row[0], "address": chr(row[1])}
+        for i in range(len(FIELDS)):
+            if valid & (1 << i):
+                result[FIELD_NAMES[i]] = [row[3 + i], self.units[i]]
+        return result
+
+
+def split_capture_line(line):
+    """Splits a capture line into (timestamp, frame), the timestamp is None when the line has none."""
+    line = line.strip()
+    parts = line.split(None, 1)
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), parts[1]
+        except ValueError:
+            pass
+    return None, line
+
+
+def convert_capture(lines, writer, has_crc=True, cache_size=1024):
+    """Converts raw capture lines into records.
+
+    A capture line is a raw data frame, optionally preceded by a timestamp.
+    Consecutive frames of one address are collected into a reading until a
+    message type repeats. Frames that fail the CRC or cannot be parsed are
+    skipped, as are readings whose units disagree with the writer's, such as
+    those of a station reconfigured part way through the capture. Returns
+    the number of frames skipped. Repeated frames are answered from a parse
+    cache of cache_size frames.
+    """
+    parser = MessageParser(has_crc, cache_size=cache_size)
+    logger = logging.getLogger("Records")
+    pending = {}
+    skipped = 0
+    timestamp = 0.0
+
+    def write(address, reading):
+        try:
+            writer.append(reading[0], address, list(reading[1].values()))
+        except ValueError as e:
+            logger.warning("Skipping reading of %s at %s: %s" % (address, reading[0], e))
+            return len(reading[1])
+        return 0
+
+    for line in lines:
+        ts, frame = split_capture_line(line)
+        if not frame:
+            continue
+        if ts is not None:
+            timestamp = ts
+        address = frame[0]
+        try:
+            message = parser.parse_message(frame)
+        except Exception as e:
+            logger.debug("Skipping %s: %s" % (frame, e))
+            skipped += 1
+            continue
+        if not isinstance(message, dict) or message.get('Type') not in ("Wind", "PTU", "Rain", "Status"):
+            continue
+
+        reading = pending.get(address)
+        if reading is not None and message['Type'] in reading[1]:
+            skipped += write(address, reading)
+            reading = None
+        if reading is None:
+            reading = pending[address] = (timestamp, {})
+        reading[1][message['Type']] = message
+
+    for address in pending:
+        skipped += write(address, pending[address])
+    writer.flush()
+    return skipped
@@ -0,0 +1,69 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+
+
+class RecoveryPolicy:
+    """How a WXT5xx recovers from bad frames.
+
+    After a bad frame the input is resynchronised and only the message
+    types that were lost are requested again, up to retries times with an
+    exponential backoff. The backoff grows with the recent error rate so a
+    noisy line is given more time to settle.
+    """
+
+    def __init__(self, retries=3, backoff=0.05, backoff_factor=2.0, max_backoff=2.0, error_weight=0.1):
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.error_weight = error_weight
+        self.error_rate = 0.0
+        self.logger = logging.getLogger(str(RecoveryPolicy))
+        self.counters = {
+            "Frames": 0,
+            "CRC Errors": 0,
+            "Timeouts": 0,
+            "Parse Errors": 0,
+            "Retries": 0,
+            "Recovered": 0,
+            "Failed": 0
+        }
+
+    def frame(self, ok):
+        self.counters["Frames"] += 1
+        self.error_rate += self.error_weight * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def count(self, counter):
+        self.counters[counter] += 1
+
+    def delay(self, attempt):
+        delay = self.backoff * self.backoff_factor ** attempt * (1 + self.error_rate)
+        return min(delay, self.max_backoff)
+
+    def resync(self, ser):
+        """Discards any partial or stale frames waiting on the port."""
+        if hasattr(ser, "reset_input_buffer"):
+            ser.reset_input_buffer()
+        elif hasattr(ser, "flushInput"):
+            ser.flushInput()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["Error Rate"] = self.error_rate
+        return stats
@@ -0,0 +1,189 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import json
+import logging
+import time
+
+# A capture is a JSON object per line:
+#   {"t": seconds since the start of the capture, "d": "w" for a write or "r" for a read, "data": latin-1 text}
+# every read is recorded as it arrived so the replay can reproduce the timing of the device.
+
+WRITE = "w"
+READ = "r"
+
+
+def encode(data):
+    if not isinstance(data, type(u"")):
+        data = data.decode("latin-1")
+    return data
+
+
+def decode(data):
+    return data.encode("latin-1")
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+class RecordingSerial:
+    """Wraps a live port and records the traffic to a capture file.
+
+    Anything other than writing and reading is passed through to the port.
+    """
+
+    def __init__(self, ser, path):
+        self.__dict__["ser"] = ser
+        self.__dict__["capture"] = open(path, "w")
+        self.__dict__["start"] = time.time()
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.ser, name, value)
+
+    def __record(self, direction, data):
+        if data:
+            self.capture.write(json.dumps({"t": time.time() - self.start, "d": direction, "data": encode(data)}) + "\n")
+
+    def write(self, data):
+        self.__record(WRITE, data)
+        return self.ser.write(data)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.__record(READ, data)
+        return data
+
+    def readline(self, *args):
+        data = self.ser.readline(*args)
+        self.__record(READ, data)
+        return data
+
+    def close(self):
+        self.capture.close()
+        self.ser.close()
+
+
+class ReplaySerial:
+    """Replays a capture in place of a Serial port.
+
+    Each write is matched against the next write in the capture and makes
+    the reads that followed it available, at their recorded delays when
+    realtime is set or immediately otherwise. With strict set a write that
+    differs from the capture raises ReplayMismatch, otherwise it is logged.
+    A read with nothing left to return behaves like a port timeout.
+    """
+
+    def __init__(self, path, realtime=False, strict=True, timeout=1.0, baudrate=19200):
+        self.path = path
+        self.realtime = realtime
+        self.strict = strict
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.port = path
+        self.logger = logging.getLogger(str(ReplaySerial))
+        with open(path) as capture:
+            self.events = []
+            for line in capture:
+                if line.strip():
+                    event = json.loads(line)
+                    self.events.append((event["t"], event["d"], decode(event["data"])))
+        self.rewind()
+
+    def rewind(self):
+        self.position = 0
+        self.buffer = b''
+        self.base = time.time()
+
+    def __next_read(self):
+        """Moves the next read of the capture into the buffer, returns False if the next event is not a read."""
+        if self.position >= len(self.events) or self.events[self.position][1] != READ:
+            return False
+        t, direction, data = self.events[self.position]
+        if self.realtime:
+            delay = self.base + t - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self.buffer += data
+        self.position += 1
+        return True
+
+    def write(self, data):
+        # Reads left over from the previous request were never collected by the caller.
+        while self.__next_read():
+            pass
+        if self.position >= len(self.events):
+            raise ReplayMismatch("Capture exhausted, unexpected write: %r" % data)
+        t, direction, expected = self.events[self.position]
+        if expected != data:
+            if self.strict:
+                raise ReplayMismatch("Expected write %r, got %r" % (expected, data))
+            self.logger.warning("Expected write %r, got %r" % (expected, data))
+        self.position += 1
+        self.base = time.time() - t
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def readline(self, *args):
+        while b'\n' not in self.buffer:
+            if not self.__next_read():
+                if self.realtime and self.timeout:
+                    time.sleep(self.timeout)
+                line, self.buffer = self.buffer, b''
+                return line
+        end = self.buffer.index(b'\n') + 1
+        line, self.buffer = self.buffer[:end], self.buffer[end:]
+        return line
+
+    def read(self, size=1):
+        while len(self.buffer) < size and self.__next_read():
+            pass
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    @property
+    def in_waiting(self):
+        return len(self.buffer)
+
+    def reset_input_buffer(self):
+        self.buffer = b''
+
+    def close(self):
+        pass
+
+
+def benchmark(path, operation="get_all_data", repeat=1, realtime=False):
+    """Replays a capture through WXT5xx, returns the duration of each call of operation.
+
+    The capture is expected to hold the handshake followed by repeat calls
+    of operation, as recorded with RecordingSerial.
+    """
+    from wxt5xx.comms import WXT5xx
+
+    device = WXT5xx(ReplaySerial(path, realtime=realtime))
+    durations = []
+    for i in range(repeat):
+        start = time.time()
+        getattr(device, operation)()
+        durations.append(time.time() - start)
+    device.close()
+    return durations
@@ -0,0 +1,75 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import logging
+import time
+
+from concurrent.futures import Future
+
+from wxt5xx.message import DATA_RESULTS
+
+
+class PollScheduler:
+    """Polls each message type at its own rate.
+
+    intervals maps a result type (WIND_RESULT, PTU_RESULT, RAIN_RESULT,
+    STATUS_RESULT) to its poll interval in seconds. The types that are due
+    together are merged into a single bus transaction with
+    WXT5xx.get_data. The device may also be a ThreadedWXT5xx, poll then
+    waits for the result of its future.
+    """
+
+    def __init__(self, device, intervals, clock=time.time):
+        for result in intervals:
+            if result not in DATA_RESULTS:
+                raise Exception("Invalid message type: %s, expected: %s" % (result, DATA_RESULTS.__repr__()))
+        self.device = device
+        self.intervals = dict(intervals)
+        self.clock = clock
+        now = self.clock()
+        self.due = dict((result, now) for result in self.intervals)
+        self.logger = logging.getLogger(str(PollScheduler))
+
+    def next_due(self):
+        return min(self.due.values())
+
+    def poll(self):
+        """Polls the message types that are due, returns a dict keyed by result type."""
+        now = self.clock()
+        due = [result for result in self.due if self.due[result] <= now]
+        if not due:
+            return {}
+
+        for result in due:
+            self.due[result] += self.intervals[result]
+            if self.due[result] <= now:
+                self.logger.debug("Poll of %s is behind schedule" % result)
+                self.due[result] = now + self.intervals[result]
+
+        results = self.device.get_data(due)
+        if isinstance(results, Future):
+            results = results.result()
+        return results
+
+    def run(self, callback, running=lambda: True):
+        while running():
+            delay = self.next_due() - self.clock()
+            if delay > 0:
+                time.sleep(delay)
+            results = self.poll()
+            if results:
+                callback(results)
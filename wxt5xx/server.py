@@ -0,0 +1,163 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+
+# path -> the WXT5xx method that answers it
+ROUTES = {
+    "/data": "get_all_data",
+    "/settings": "get_all_settings",
+    "/settings/ptu": "get_ptu_settings",
+    "/settings/wind": "get_wind_settings",
+    "/settings/precipitation": "get_precipitation_settings",
+    "/settings/supervisor": "get_supervisor_settings",
+}
+
+
+class CacheEntry:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.value = None
+        self.time = None
+        self.loading = False
+        self.generation = 0
+        self.error = None
+
+
+class CachedDevice:
+    """Answers reads from a cache that is refreshed from the device at most once per ttl.
+
+    Concurrent requests for a stale entry are coalesced, the first one
+    polls the device and the others wait for its result, or its error.
+    """
+
+    def __init__(self, device, ttl=5.0):
+        self.device = device
+        self.ttl = ttl
+        self.device_lock = threading.Lock()
+        self.entries = dict((method, CacheEntry()) for method in ROUTES.values())
+        self.counters = {"Hits": 0, "Polls": 0, "Coalesced": 0}
+        self.counters_lock = threading.Lock()
+        self.logger = logging.getLogger(str(CachedDevice))
+
+    def count(self, counter):
+        with self.counters_lock:
+            self.counters[counter] += 1
+
+    def get(self, method):
+        """Returns (value, time read from the device)."""
+        entry = self.entries[method]
+        with entry.condition:
+            generation = entry.generation
+            while True:
+                if entry.time is not None and time.time() - entry.time < self.ttl:
+                    self.count("Hits")
+                    return entry.value, entry.time
+                if entry.generation != generation and entry.error is not None:
+                    raise entry.error
+                if not entry.loading:
+                    entry.loading = True
+                    self.count("Polls")
+                    break
+                self.count("Coalesced")
+                entry.condition.wait()
+
+        value = None
+        error = None
+        try:
+            with self.device_lock:
+                value = getattr(self.device, method)()
+        except Exception as e:
+            self.logger.warning("Polling %s failed: %s" % (method, e))
+            error = e
+
+        with entry.condition:
+            entry.loading = False
+            entry.generation += 1
+            entry.error = error
+            if error is None:
+                entry.value = value
+                entry.time = time.time()
+            entry.condition.notify_all()
+        if error is not None:
+            raise error
+        return value, entry.time
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        self.server.logger.debug("%s %s" % (self.address_string(), format % args))
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path not in ROUTES:
+            self.send_json(404, {"Error": "Unknown path %s, expected one of %s" % (path, sorted(ROUTES.keys()))})
+            return
+        try:
+            value, read = self.server.cache.get(ROUTES[path])
+        except Exception as e:
+            self.send_json(503, {"Error": str(e)})
+            return
+        self.send_json(200, {"Time": read, "Age": time.time() - read, "Data": value})
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        UnixStreamServer.server_bind(self)
+
+
+def create_server(cache, socket_path=None, host="127.0.0.1", port=8080):
+    """Serves cache over HTTP, on the Unix socket socket_path if given, otherwise on host:port."""
+    if socket_path is not None:
+        server = ThreadingUnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.cache = cache
+    server.logger = logging.getLogger("Server")
+    return server
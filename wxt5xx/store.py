@@ -0,0 +1,260 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import calendar
+import logging
+import os
+import struct
+import time
+
+from wxt5xx.records import RecordWriter, read_header, numpy, record_dtype, FIELD_NAMES, HEADER_SIZE, \
+    RECORD_FORMAT, RECORD_SIZE
+from wxt5xx.units import normalise_column
+
+# The store keeps one record file per station address and time partition:
+#   <root>/<address>/<partition>.wxr    the records, see wxt5xx.records
+#   <root>/<address>/<partition>.idx    one entry per block of records
+# an index entry is the first and last timestamp of the block, little endian float64s,
+# entry n covers records n * block_size up to (n + 1) * block_size.
+
+PARTITIONS = {
+    "day": ("%Y%m%d", 86400),
+    "hour": ("%Y%m%d%H", 3600)
+}
+
+INDEX_FORMAT = "<dd"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+
+
+def read_index(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    return [list(struct.unpack_from(INDEX_FORMAT, data, i)) for i in range(0, len(data) - INDEX_SIZE + 1, INDEX_SIZE)]
+
+
+def read_timestamps(f, offset, length):
+    f.seek(HEADER_SIZE + offset * RECORD_SIZE)
+    data = f.read(length * RECORD_SIZE)
+    return [struct.unpack_from("<d", data, i)[0] for i in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE)]
+
+
+class Partition:
+    """An open record file of one address and time partition, with its block index.
+
+    The partition owns the flushes of its writer so the records and the
+    index are written together, an index left behind by a crash is rebuilt
+    from the record file when the partition is opened.
+    """
+
+    def __init__(self, path, block_size):
+        self.path = path
+        self.index_path = path[:-len(".wxr")] + ".idx"
+        self.block_size = block_size
+        self.writer = RecordWriter(path, batch_size=None)
+        self.count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+        self.index = read_index(self.index_path)
+        self.dirty = None
+        self.logger = logging.getLogger(str(Partition))
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        """Re-indexes the last indexed block and any records past it, those written after the index was flushed."""
+        blocks = (self.count + self.block_size - 1) // self.block_size
+        first = max(0, min(len(self.index), blocks) - 1)
+        index = self.index[:first]
+        with open(self.path, "rb") as f:
+            for block in range(first, blocks):
+                offset = block * self.block_size
+                timestamps = read_timestamps(f, offset, min(self.block_size, self.count - offset))
+                index.append([min(timestamps), max(timestamps)])
+        if index != self.index:
+            self.logger.warning("Rebuilt the index of %s from block %s" % (self.path, first))
+            self.index = index
+            self.dirty = first
+
+    def append(self, timestamp, address, messages):
+        self.writer.append(timestamp, address, messages)
+        block = self.count // self.block_size
+        if block == len(self.index):
+            self.index.append([timestamp, timestamp])
+        else:
+            entry = self.index[block]
+            entry[0] = min(entry[0], timestamp)
+            entry[1] = max(entry[1], timestamp)
+        if self.dirty is None or block < self.dirty:
+            self.dirty = block
+        self.count += 1
+        if len(self.writer.rows) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        self.writer.flush()
+        if self.dirty is None:
+            return
+        mode = "r+b" if os.path.exists(self.index_path) else "wb"
+        with open(self.index_path, mode) as f:
+            f.seek(self.dirty * INDEX_SIZE)
+            f.write(b''.join(struct.pack(INDEX_FORMAT, *entry) for entry in self.index[self.dirty:]))
+            f.truncate()
+        self.dirty = None
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class RecordStore:
+    """Station readings partitioned by address and by day or hour (UTC).
+
+    A query only opens the partitions that overlap its time range and only
+    reads the blocks whose index entry overlaps it. A station's partitions
+    are closed once it appends to a later one, a late reading reopens its
+    partition.
+    """
+
+    def __init__(self, root, partition="day", block_size=256):
+        if partition not in PARTITIONS:
+            raise Exception("Invalid partition: %s, expected: %s" % (partition, sorted(PARTITIONS.keys()).__repr__()))
+        self.root = root
+        self.format, self.period = PARTITIONS[partition]
+        self.block_size = block_size
+        self.open = {}
+        self.logger = logging.getLogger(str(RecordStore))
+
+    def partition_path(self, address, timestamp):
+        name = time.strftime(self.format, time.gmtime(timestamp))
+        return os.path.join(self.root, str(address), name + ".wxr")
+
+    def append(self, timestamp, address, messages):
+        """Stores one reading, messages is a list of parsed data messages such as the result of get_all_data."""
+        path = self.partition_path(address, timestamp)
+        partition = self.open.get(path)
+        if partition is None:
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # Partition names sort by time, the station has moved on from its older partitions.
+            for older in [other for other in self.open if os.path.dirname(other) == directory and other < path]:
+                self.open.pop(older).close()
+            partition = self.open[path] = Partition(path, self.block_size)
+        partition.append(timestamp, address, messages)
+
+    def flush(self):
+        for partition in self.open.values():
+            partition.flush()
+
+    def close(self):
+        for partition in self.open.values():
+            partition.close()
+        self.open = {}
+
+    def partitions(self, address, start, end):
+        """The paths of the partitions of address that can hold readings from start to end."""
+        directory = os.path.join(self.root, str(address))
+        if not os.path.isdir(directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".wxr"):
+                continue
+            try:
+                first = calendar.timegm(time.strptime(name[:-len(".wxr")], self.format))
+            except ValueError:
+                continue
+            if first <= end and first + self.period > start:
+                result.append(os.path.join(directory, name))
+        return result
+
+    def query(self, address, start, end, fields=None):
+        """Returns the readings of address with start <= timestamp <= end.
+
+        The result is {"Units": {field: unit}, "Data": {"timestamp": column, field: column}},
+        the columns are numpy arrays when numpy is available and lists otherwise.
+        Invalid or missing values are NaN. A field whose unit changed between
+        the partitions read is converted to its SI unit partition by partition,
+        see wxt5xx.units.
+        """
+        if fields is None:
+            fields = FIELD_NAMES
+        for field in fields:
+            if field not in FIELD_NAMES:
+                raise Exception("Invalid field: %s, expected: %s" % (field, FIELD_NAMES.__repr__()))
+        self.flush()
+
+        columns = ["timestamp"] + list(fields)
+        parts = []
+        for path in self.partitions(address, start, end):
+            chunks = []
+            with open(path, "rb") as f:
+                header_units = read_header(f)
+                count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+                index = read_index(path[:-len(".wxr")] + ".idx")
+                for block in range((count + self.block_size - 1) // self.block_size):
+                    # The last indexed block and those past it may hold records the index has not seen yet.
+                    if block < len(index) - 1:
+                        first, last = index[block]
+                        if last < start or first > end:
+                            continue
+                    offset = block * self.block_size
+                    length = min(self.block_size, count - offset)
+                    f.seek(HEADER_SIZE + offset * RECORD_SIZE)
+                    chunks.append(f.read(length * RECORD_SIZE))
+            if chunks:
+                part_units = dict((field, header_units[FIELD_NAMES.index(field)]) for field in fields)
+                parts.append((part_units, self.decode(chunks, columns, start, end)))
+
+        units = {}
+        for field in fields:
+            found = set(part[0][field] for part in parts if part[0][field] is not None)
+            if len(found) == 1:
+                units[field] = found.pop()
+            elif len(found) > 1:
+                targets = set()
+                for part_units, data in parts:
+                    data[field], target = normalise_column(data[field], part_units[field])
+                    if part_units[field] is not None:
+                        targets.add(target)
+                if len(targets) > 1:
+                    raise ValueError("Cannot query %s, its units %s have no common SI unit" % (field, sorted(found)))
+                units[field] = targets.pop()
+
+        data = {}
+        for column in columns:
+            if numpy is not None:
+                data[column] = numpy.concatenate([numpy.asarray(part[1][column]) for part in parts]) if parts \
+                    else numpy.zeros(0, dtype=record_dtype()[column])
+            else:
+                data[column] = [value for part in parts for value in part[1][column]]
+        return {"Units": units, "Data": data}
+
+    def decode(self, chunks, columns, start, end):
+        """Decodes the rows of chunks with start <= timestamp <= end into {column: values}."""
+        if numpy is not None:
+            rows = numpy.frombuffer(b''.join(chunks), dtype=record_dtype())
+            rows = rows[(rows["timestamp"] >= start) & (rows["timestamp"] <= end)]
+            return dict((column, numpy.array(rows[column])) for column in columns)
+        positions = [0] + [3 + FIELD_NAMES.index(field) for field in columns[1:]]
+        data = dict((column, []) for column in columns)
+        for chunk in chunks:
+            for i in range(0, len(chunk), RECORD_SIZE):
+                row = struct.unpack_from(RECORD_FORMAT, chunk, i)
+                if start <= row[0] <= end:
+                    for column, position in zip(columns, positions):
+                        data[column].append(row[position])
+        return data
@@ -0,0 +1,152 @@
+# pyWXT5xx parses and creates messages for the Vaisala WXT5xx series Weather Station.
+# Copyright (C) 2016  NigelB
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# unit label from BaseMessageParser.parse_unit -> (SI unit, scale, offset), si = value * scale + offset
+CONVERSIONS = {
+    'C': ('C', 1.0, 0.0),
+    'F': ('C', 5.0 / 9.0, -32.0 * 5.0 / 9.0),
+    'm/s': ('m/s', 1.0, 0.0),
+    'km/h': ('m/s', 1 / 3.6, 0.0),
+    'mph': ('m/s', 0.44704, 0.0),
+    'kn': ('m/s', 1852.0 / 3600.0, 0.0),
+    'Pa': ('Pa', 1.0, 0.0),
+    'hPa': ('Pa', 100.0, 0.0),
+    'bar': ('Pa', 100000.0, 0.0),
+    'mmHg': ('Pa', 133.322387415, 0.0),
+    'inHg': ('Pa', 3386.389, 0.0),
+    'mm': ('mm', 1.0, 0.0),
+    'in': ('mm', 25.4, 0.0),
+    'mm/h': ('mm/h', 1.0, 0.0),
+    'in/h': ('mm/h', 25.4, 0.0),
+    'hits/cm2': ('hits/cm2', 1.0, 0.0),
+    'hits/in2': ('hits/cm2', 1 / 6.4516, 0.0),
+    'hits/cm2h': ('hits/cm2h', 1.0, 0.0),
+    'hits/in2h': ('hits/cm2h', 1 / 6.4516, 0.0),
+}
+
+
+def si_unit(unit):
+    """The unit a column of unit is normalised to, units without a conversion are kept."""
+    if unit in CONVERSIONS:
+        return CONVERSIONS[unit][0]
+    return unit
+
+
+def normalise_column(values, unit):
+    """Converts a whole column of one unit, returns (values, si unit).
+
+    With numpy the column is converted with a single array operation,
+    otherwise it is converted value by value into a list.
+    """
+    if unit not in CONVERSIONS:
+        return values, unit
+    target, scale, offset = CONVERSIONS[unit]
+    if scale == 1.0 and offset == 0.0:
+        return values, target
+    if numpy is not None:
+        return numpy.asarray(values, dtype=numpy.float64) * scale + offset, target
+    return [value * scale + offset for value in values], target
+
+
+def normalise_mixed(values, units):
+    """Converts a column whose rows have different units, units gives the unit of every row.
+
+    The rows are grouped by unit and each group is converted with one
+    operation. Returns (values, si units).
+    """
+    if numpy is not None:
+        values = numpy.array(values, dtype=numpy.float64)
+        labels, inverse = numpy.unique(numpy.array(["" if unit is None else unit for unit in units]), return_inverse=True)
+        targets = []
+        for i in range(len(labels)):
+            unit = str(labels[i]) or None
+            mask = inverse == i
+            values[mask], target = normalise_column(values[mask], unit)
+            targets.append(target)
+        return values, [targets[i] for i in inverse]
+
+    groups = {}
+    for i in range(len(units)):
+        groups.setdefault(units[i], []).append(i)
+    result = list(values)
+    targets = list(units)
+    for unit in groups:
+        rows = groups[unit]
+        converted, target = normalise_column([values[i] for i in rows], unit)
+        for i, value in zip(rows, converted):
+            result[i] = value
+            targets[i] = target
+    return result, targets
+
+
+def normalise(result):
+    """Normalises a columnar result, such as from RecordStore.query, to SI units.
+
+    result is {"Units": {field: unit}, "Data": {field: column}}, columns
+    without a unit are copied unchanged.
+    """
+    units = {}
+    data = {}
+    for field in result["Data"]:
+        unit = result["Units"].get(field)
+        if unit is None:
+            data[field] = result["Data"][field]
+            continue
+        data[field], units[field] = normalise_column(result["Data"][field], unit)
+    return {"Units": units, "Data": data}
+
+
+def merge(results):
+    """Merges the columnar results of several stations into one normalised result.
+
+    The stations may use different units for the same field, every column is
+    converted with one operation per unit group.
+    """
+    fields = []
+    for result in results:
+        for field in result["Data"]:
+            if field not in fields:
+                fields.append(field)
+
+    units = {}
+    data = {}
+    for field in fields:
+        columns = []
+        row_units = []
+        for result in results:
+            length = len(list(result["Data"].values())[0]) if result["Data"] else 0
+            columns.append(result["Data"][field] if field in result["Data"] else [float("nan")] * length)
+            row_units.extend([result["Units"].get(field)] * length)
+        if numpy is not None:
+            values = numpy.concatenate([numpy.asarray(column, dtype=numpy.float64) for column in columns])
+        else:
+            values = [value for column in columns for value in column]
+
+        if all(unit is None for unit in row_units):
+            data[field] = values
+            continue
+        data[field], targets = normalise_mixed(values, row_units)
+        known = [unit for unit in set(targets) if unit is not None]
+        if len(known) > 1:
+            raise ValueError("Cannot merge %s, its units %s have no common SI unit" % (field, known))
+        units[field] = known[0] if known else None
+    return {"Units": units, "Data": data}